@@ -0,0 +1,193 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from urllib.parse import urldefrag, urlparse, parse_qsl, urlencode, urlunparse
+from fetchers import HttpFetcher, http_status
+from scheduler import THROTTLE_STATUSES
+
+import os
+import json
+import hashlib
+import logging
+import mimetypes
+import threading
+
+SAFE_EXTENSIONS = {'.css', '.gif', '.jpg', '.jpeg', '.png', '.webp', '.svg', '.ico', '.bmp', '.woff', '.woff2'}
+
+
+def normalize_asset_url(url):
+    """Drop the fragment and phpBB session id so the same asset always has the same key"""
+    url, _ = urldefrag(url)
+    parsed = urlparse(url)
+    query = urlencode([(k, v) for k, v in parse_qsl(parsed.query, keep_blank_values=True) if k != 'sid'])
+    return urlunparse((parsed.scheme, parsed.netloc.lower(), parsed.path, '', query, ''))
+
+
+def asset_extension(url, content_type):
+    """Pick a file extension from the response type, falling back to the URL path"""
+    extension = mimetypes.guess_extension((content_type or '').split(';')[0].strip()) or ''
+    if extension not in SAFE_EXTENSIONS:
+        extension = os.path.splitext(urlparse(url).path)[1].lower()
+    return extension if extension in SAFE_EXTENSIONS else ''
+
+
+class AssetCache:
+    """
+    Images and stylesheets shared by every page of the mirror. Files are stored
+    once under assets/<hash prefix>/<content hash><ext>, and an index maps each
+    normalized URL to its file so an asset is only ever downloaded once. Downloads
+    run concurrently on a pooled session; with refresh enabled, known assets are
+    revalidated with ETag / If-Modified-Since instead of being downloaded again.
+    """
+
+    def __init__(self, output_dir, workers=8, refresh=False, cookies_file=None, timeout=30, rate_limiter=None,
+                 max_retries=3):
+        """
+        :param rate_limiter: HostRateLimiter shared with the page fetches, so assets count against the same budget
+        :param max_retries: Retries of a download the host answered with 429/503
+        """
+        self.output_dir = output_dir
+        self.assets_dir = os.path.join(output_dir, 'assets')
+        self.index_file = os.path.join(self.assets_dir, 'index.json')
+        self.refresh = refresh
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter
+        self.max_retries = max_retries
+        self.http = HttpFetcher(pool_size=workers, timeout=timeout, cookies_file=cookies_file)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='asset')
+        self.lock = threading.Lock()
+        self.futures = {}
+        self.hit_counts = {}
+        self.index = {}
+        if os.path.exists(self.index_file):
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                self.index = json.load(f)
+        self.stats = {
+            'requests': 0,
+            'hits': 0,
+            'downloads': 0,
+            'not_modified': 0,
+            'duplicates': 0,
+            'failures': 0,
+            'bytes_downloaded': 0,
+            'bytes_saved': 0,
+        }
+
+    def load_cookies(self, cookies):
+        self.http.load_cookies(cookies)
+
+    def get(self, url):
+        """
+        Look up or start downloading an asset.
+        :return: Future resolving to the file path relative to output_dir, or None on failure
+        """
+        key = normalize_asset_url(url)
+        with self.lock:
+            self.stats['requests'] += 1
+            future = self.futures.get(key)
+            if future is not None:
+                self.count_hit(key)
+                return future
+            entry = self.index.get(key)
+            if entry and not self.refresh and os.path.exists(os.path.join(self.output_dir, entry['path'])):
+                self.count_hit(key)
+                future = Future()
+                future.set_result(entry['path'])
+            else:
+                future = self.executor.submit(self.download, key, url)
+            self.futures[key] = future
+            return future
+
+    def count_hit(self, key):
+        self.stats['hits'] += 1
+        self.hit_counts[key] = self.hit_counts.get(key, 0) + 1
+
+    def download(self, key, url):
+        with self.lock:
+            entry = self.index.get(key)
+        headers = {}
+        if entry and os.path.exists(os.path.join(self.output_dir, entry['path'])):
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        try:
+            response = self.fetch(url, headers)
+            if response.status_code == 304 and headers:
+                with self.lock:
+                    self.stats['not_modified'] += 1
+                    self.stats['bytes_saved'] += entry['size']
+                return entry['path']
+            response.raise_for_status()
+        except Exception as e:
+            logging.error(f"Failed to download asset {url}: {str(e)}")
+            with self.lock:
+                self.stats['failures'] += 1
+                if http_status(e) in THROTTLE_STATUSES:
+                    # Not remembered, so the next page using the asset asks for it again
+                    self.futures.pop(key, None)
+            return None
+
+        content = response.content
+        digest = hashlib.sha256(content).hexdigest()
+        path = f"assets/{digest[:2]}/{digest}{asset_extension(url, response.headers.get('Content-Type'))}"
+        full_path = os.path.join(self.output_dir, path)
+        if os.path.exists(full_path):
+            duplicate = True
+        else:
+            duplicate = False
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            temp_path = f"{full_path}.{threading.get_ident()}.tmp"
+            with open(temp_path, 'wb') as f:
+                f.write(content)
+            os.replace(temp_path, full_path)
+
+        with self.lock:
+            self.stats['downloads'] += 1
+            self.stats['bytes_downloaded'] += len(content)
+            if duplicate:
+                self.stats['duplicates'] += 1
+            self.index[key] = {
+                'path': path,
+                'size': len(content),
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+            }
+        return path
+
+    def fetch(self, url, headers):
+        """GET an asset within the host's rate limit, retrying when the host throttles us like fetch_page does"""
+        for attempt in range(self.max_retries + 1):
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire(url)
+            status = None
+            try:
+                response = self.http.session.get(url, headers=headers, timeout=self.timeout)
+                status = response.status_code
+            finally:
+                if self.rate_limiter is not None:
+                    self.rate_limiter.release(url, status)
+            if status not in THROTTLE_STATUSES or attempt == self.max_retries:
+                return response
+            logging.warning(f"Retrying asset {url} after HTTP {status} (attempt {attempt + 1})")
+
+    def report(self):
+        stats = self.stats
+        # Hits on assets still downloading are only priced once their size is known
+        bytes_saved = stats['bytes_saved'] + sum(
+            self.index[key]['size'] * count for key, count in self.hit_counts.items() if key in self.index)
+        hit_rate = stats['hits'] / stats['requests'] if stats['requests'] else 0
+        return (
+            f"Assets: {stats['requests']} requests, {stats['hits']} cache hits ({hit_rate:.1%}), "
+            f"{stats['downloads']} downloaded ({stats['bytes_downloaded']} bytes, "
+            f"{stats['duplicates']} duplicate contents), {stats['not_modified']} not modified, "
+            f"{stats['failures']} failed, {bytes_saved} bytes saved"
+        )
+
+    def close(self):
+        """Wait for pending downloads and persist the URL index"""
+        self.executor.shutdown(wait=True)
+        self.http.close()
+        os.makedirs(self.assets_dir, exist_ok=True)
+        with self.lock:
+            with open(self.index_file, 'w', encoding='utf-8') as f:
+                json.dump(self.index, f)
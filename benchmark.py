@@ -0,0 +1,597 @@
+from fixture_server import FixtureBoard, start_fixture_server
+from mirror_site import ForumMirror
+from fetchers import FETCH_ENGINES
+from frontier import Frontier
+from url_index import BloomFilter, CompactSet, IntQueue, IntSet, URLInterner, number_key
+from collections import deque
+from page_parser import PARSER_BACKENDS, parse_page, resolve_backend
+from link_rewriter import rewrite_mirror_links
+from structured_data import extract_posts, extract_to_file, process_nested_directories
+from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor
+
+import multiprocessing
+import subprocess
+import tempfile
+import shutil
+import argparse
+import json
+import time
+import re
+import sys
+import gc
+import os
+
+
+def benchmark_fetch(engine, pages):
+    """
+    Fetch the first `pages` pages of a fixture board with one fetch engine.
+    :return: Pages per second
+    """
+    board = FixtureBoard()
+    server = start_fixture_server(board)
+    urls = [server.base_url + path.lstrip('/') for path in board.page_urls()[:pages]]
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        # A politeness cap far above what one engine reaches, so the engine is measured and not the limiter
+        mirror = ForumMirror(server.base_url, output_dir, engine=engine, rate_limit=1000.0)
+        try:
+            start = time.perf_counter()
+            for url in urls:
+                mirror.fetch_page(url)
+            elapsed = time.perf_counter() - start
+        finally:
+            mirror.fetcher.close()
+            if mirror.driver is not None:
+                mirror.driver.quit()
+            server.shutdown()
+
+    return len(urls) / elapsed
+
+
+def benchmark_drivers(pool_size, pages, latency):
+    """
+    Render fixture pages through the Selenium driver pool, one worker per browser.
+    :return: Pages per second
+    """
+    board = FixtureBoard()
+    server = start_fixture_server(board, latency=latency)
+    urls = [server.base_url + path.lstrip('/') for path in board.page_urls()[:pages]]
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        mirror = ForumMirror(server.base_url, output_dir, engine='selenium', rate_limit=1000.0,
+                             max_in_flight=pool_size, driver_pool_size=pool_size)
+        try:
+            # Start the browsers before timing so startup cost is not counted
+            with ThreadPoolExecutor(max_workers=pool_size) as executor:
+                list(executor.map(mirror.fetch_page, urls[:pool_size]))
+                start = time.perf_counter()
+                list(executor.map(mirror.fetch_page, urls))
+                elapsed = time.perf_counter() - start
+        finally:
+            mirror.fetcher.close()
+            server.shutdown()
+
+    print(mirror.readiness.report())
+    return len(urls) / elapsed
+
+
+def mirrored_files(output_dir):
+    """Relative paths of every file a crawl wrote"""
+    return sorted(
+        os.path.relpath(os.path.join(root, name), output_dir)
+        for root, _, files in os.walk(output_dir)
+        for name in files
+    )
+
+
+def benchmark_crawl(workers, latency, rate_limit, board=None):
+    """
+    Mirror a whole fixture board with a given number of crawl workers.
+    :return: (pages per second, list of mirrored files)
+    """
+    board = board or FixtureBoard()
+    server = start_fixture_server(board, latency=latency)
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        mirror = ForumMirror(server.base_url, output_dir, rate_limit=rate_limit, max_in_flight=workers)
+        start = time.perf_counter()
+        mirror.mirror_forum(workers=workers, progress_interval=0)
+        elapsed = time.perf_counter() - start
+        server.shutdown()
+        files = mirrored_files(output_dir)
+
+    return len(mirror.visited_urls) / elapsed, files
+
+
+def benchmark_frontier(size):
+    """
+    Push `size` topic page URLs (every URL twice, as happens when pages link to
+    each other) into a Frontier and pop them all again.
+    :return: Nanoseconds per push/pop operation
+    """
+    frontier = Frontier(priority=lambda url: 0 if 'start=' not in url else 1, priorities=2)
+    urls = [f'https://forum.example/viewtopic.php?f={i % 50}&t={i // 4}&start={i % 4 * 10}' for i in range(size)]
+    start = time.perf_counter()
+    for url in urls:
+        frontier.push(url)
+        frontier.push(url)
+    while frontier.pop() is not None:
+        pass
+    elapsed = time.perf_counter() - start
+    return elapsed * 1e9 / (size * 3)
+
+
+def benchmark_list_queue(size):
+    """The previous list.pop(0) queue, for comparison"""
+    queue = []
+    urls = [f'https://forum.example/viewtopic.php?f={i % 50}&t={i // 4}&start={i % 4 * 10}' for i in range(size)]
+    start = time.perf_counter()
+    for url in urls:
+        queue.append(url)
+    while queue:
+        queue.pop(0)
+    elapsed = time.perf_counter() - start
+    return elapsed * 1e9 / (size * 2)
+
+
+def synthetic_urls(count, normalized=False):
+    """Topic page URLs of a large board: 200 sections, 10 pages per topic"""
+    for i in range(count):
+        topic, page = divmod(i, 10)
+        query = f"f={topic % 200 + 1}&start={page * 10}&t={topic}" if normalized else \
+            f"f={topic % 200 + 1}&t={topic}&start={page * 10}&sid=8f3a9c2e"
+        yield f"https://forum.example.com/viewtopic.php?{query}"
+
+
+def deep_size(collection):
+    return sys.getsizeof(collection) + sum(sys.getsizeof(item) for item in collection)
+
+
+def benchmark_url_index(count):
+    """
+    Memory of the crawl's URL structures for `count` URLs, as plain Python sets and deques of
+    strings, as packed integer keys in arrays, and with the sets on disk behind Bloom filters.
+    :return: List of (structure, {mode: bytes})
+    """
+    interner = URLInterner('https://forum.example.com/')
+    rows = []
+
+    seen = set(synthetic_urls(count, normalized=True))
+    python_seen = deep_size(seen)
+    del seen
+    keys = IntSet()
+    for url in synthetic_urls(count, normalized=True):
+        keys.add(interner.intern(url))
+    rows.append(('frontier seen index', {'python': python_seen, 'compact': keys.nbytes(),
+                                         'disk': len(BloomFilter(count).bits)}))
+    # The visited set holds the same number of URLs, as fetched
+    visited = set(synthetic_urls(count))
+    rows.append(('visited URLs', {'python': deep_size(visited), 'compact': keys.nbytes(),
+                                  'disk': len(BloomFilter(count).bits)}))
+    del visited
+    array_of_keys = [key for key in keys.table if key]
+    del keys
+    gc.collect()
+
+    queue = deque(synthetic_urls(count))
+    python_queue = deep_size(queue)
+    del queue
+    queue = IntQueue()
+    for key in array_of_keys:
+        queue.append(key)
+    queue_bytes = sum(sys.getsizeof(chunk) for chunk in queue.chunks)
+    rows.append(('queue (all pending)', {'python': python_queue, 'compact': queue_bytes, 'disk': queue_bytes}))
+    del queue, array_of_keys
+
+    topic_numbers = [str(topic) for topic in range(count // 10)]
+    topics = CompactSet(number_key)
+    topics.update(topic_numbers)
+    rows.append(('topic numbers', {'python': deep_size(set(topic_numbers)), 'compact': topics.keys.nbytes(),
+                                   'disk': topics.keys.nbytes()}))
+    return rows
+
+
+def load_parse_corpus(corpus_dir=None, pages=200):
+    """
+    Topic pages to parse: the saved pages of an existing mirror when a directory
+    is given, otherwise pages rendered by the fixture board.
+    :return: List of (url, html) pairs
+    """
+    corpus = []
+    if corpus_dir:
+        for root, _, files in os.walk(corpus_dir):
+            for name in files:
+                if name.startswith('page_') and name.endswith('.html'):
+                    with open(os.path.join(root, name), 'r', encoding='utf-8') as f:
+                        corpus.append(('https://forum.example/viewtopic.php?t=1', f.read()))
+                if len(corpus) >= pages:
+                    return corpus
+        return corpus
+
+    board = FixtureBoard()
+    for path in board.page_urls():
+        if path.startswith('/viewtopic.php'):
+            _, _, body = board.render('/viewtopic.php', path.split('?', 1)[1])
+            corpus.append(('https://forum.example' + path, body.decode('utf-8')))
+        if len(corpus) >= pages:
+            break
+    return corpus
+
+
+def parse_like_before(url, html_content):
+    """The previous per-page work: several find_all walks, then a second parse for extraction"""
+    soup = BeautifulSoup(html_content, 'html.parser')
+    soup.find_all('img')
+    soup.find_all('link', rel='stylesheet')
+    soup.find_all('a', href=True)
+    pagination = soup.find('ul', class_='pagination')
+    if pagination:
+        pagination.find_all('a')
+    saved = str(soup)
+    extract_posts_like_before(BeautifulSoup(saved, 'html.parser'), '1')
+
+
+def extract_post_like_before(post, topic_id, topic_title):
+    """
+    The previous hard-coded extraction of one post, kept as the baseline of the profiles benchmark.
+    :param post: The <article role="article"> element of the post
+    :param topic_id: Topic number the post belongs to
+    :param topic_title: Title of the topic page
+    :return: A dictionary with the post's data
+    """
+    # Find the parent div with class 'clearfix'
+    parent_div = post.find_parent('div', class_='clearfix')
+    post_id = parent_div['id'] if parent_div and parent_div.has_attr('id') else None
+
+    panelHeading = post.find('div', class_='panel-heading')
+    panelBody = post.find('div', class_='panel-body')
+    # Assuming `element` contains the parsed HTML of the div with class "panel-heading"
+    post_title = panelHeading.find('h3').find('a').text
+    post_author = panelHeading.find('a', class_='username-coloured')  # Try finding in <a> tag first
+
+    # If <a> tag is not found, look for <span> with class "username-coloured"
+    if post_author is None:
+        post_author = panelHeading.find('span', class_='username-coloured')
+
+    # Extract the text if the tag was found
+    post_author = post_author.text.strip() if post_author else "Author not found"
+
+    timestamp = panelHeading.find('span', class_='hidden-xs').text.strip()
+    content_div = panelBody.find('div', class_='content')
+    content_text = ' '.join(content_div.stripped_strings)
+    content_text = re.sub(r"- (Thứ \d|Chủ nhật) Tháng \d{1,2} \d{2}, \d{4} \d{1,2}:\d{2} (am|pm)", "", content_text).strip()
+    return {
+        'topic_id': topic_id,
+        'topic_title': topic_title,
+        'post_id': post_id,
+        'post_title': post_title,
+        'author': post_author,
+        'content': content_text,
+        'timestamp': timestamp,
+    }
+
+
+def extract_posts_like_before(soup, topic_id):
+    topic_title = soup.head.title.text if soup.head and soup.head.title else 'No Title'
+    return [extract_post_like_before(post, topic_id, topic_title) for post in soup.find_all('article', role='article')]
+
+
+def benchmark_profiles(corpus, profile=None):
+    """
+    Extract the posts of the same parsed pages with the previous extractor and with extract_posts.
+    :param profile: Theme profile for extract_posts, or None to detect it per page
+    :return: (posts per second before, posts per second now, whether both extracted the same posts)
+    """
+    soups = [BeautifulSoup(html_content, 'html.parser') for _, html_content in corpus]
+    start = time.perf_counter()
+    before = [extract_posts_like_before(soup, '1') for soup in soups]
+    before_elapsed = time.perf_counter() - start
+    start = time.perf_counter()
+    after = [extract_posts(soup, '1', profile=profile) for soup in soups]
+    after_elapsed = time.perf_counter() - start
+    return sum(map(len, before)) / before_elapsed, sum(map(len, after)) / after_elapsed, before == after
+
+
+def benchmark_parse(corpus, backend=None):
+    """
+    :param backend: Parser backend for parse_page, or None for the previous approach
+    :return: Pages per second
+    """
+    start = time.perf_counter()
+    for url, html_content in corpus:
+        if backend is None:
+            parse_like_before(url, html_content)
+        else:
+            page = parse_page(html_content, url, backend=backend, topic_id='1')
+            str(page.soup)
+    return len(corpus) / (time.perf_counter() - start)
+
+
+def write_fixture_corpus(board, output_dir):
+    """Save every topic page of a fixture board in the mirror's directory layout"""
+    for path in board.page_urls():
+        if not path.startswith('/viewtopic.php'):
+            continue
+        query = path.split('?', 1)[1]
+        params = dict(param.split('=') for param in query.split('&'))
+        page_file = os.path.join(output_dir, f"section_{params['f']}", f"topic_{params['t']}",
+                                 f"page_{params.get('start', '0')}.html")
+        os.makedirs(os.path.dirname(page_file), exist_ok=True)
+        _, _, body = board.render('/viewtopic.php', query)
+        with open(page_file, 'wb') as f:
+            f.write(body)
+
+
+def benchmark_extract(corpus_dir, workers):
+    """
+    Run the parallel extractor over a corpus.
+    :return: (posts per second, number of posts)
+    """
+    with tempfile.TemporaryDirectory() as output_dir:
+        start = time.perf_counter()
+        post_count, _ = extract_to_file(corpus_dir, os.path.join(output_dir, 'posts.jsonl'), workers=workers)
+        elapsed = time.perf_counter() - start
+    return post_count / elapsed, post_count
+
+
+def benchmark_links(corpus_dir, workers):
+    """
+    Rewrite the links of a copy of a mirror.
+    :return: (pages per second, pages rewritten)
+    """
+    with tempfile.TemporaryDirectory() as output_dir:
+        shutil.copytree(os.path.join(corpus_dir, 'forum'), os.path.join(output_dir, 'forum'))
+        start = time.perf_counter()
+        _, rewritten, _ = rewrite_mirror_links(output_dir, 'http://127.0.0.1/', workers=workers)
+        elapsed = time.perf_counter() - start
+    return rewritten / elapsed, rewritten
+
+
+def peak_rss_mb(who='self'):
+    """Peak resident memory of this process ('self') or of its largest finished child ('children'), in MB"""
+    try:
+        import resource
+    except ImportError:
+        return None  # Not available on Windows
+    usage = resource.getrusage(resource.RUSAGE_SELF if who == 'self' else resource.RUSAGE_CHILDREN)
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return round(usage.ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def call_and_send(connection, function, args):
+    connection.send(function(*args))
+    connection.close()
+
+
+def run_in_process(function, *args):
+    """Run function in a fresh process, so its peak memory is measured on its own"""
+    context = multiprocessing.get_context('spawn')
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=call_and_send, args=(sender, function, args))
+    process.start()
+    result = receiver.recv()
+    process.join()
+    return result
+
+
+def suite_crawl(base_url, output_dir, workers, rate_limit):
+    mirror = ForumMirror(base_url, output_dir, rate_limit=rate_limit, max_in_flight=workers)
+    start = time.perf_counter()
+    mirror.mirror_forum(workers=workers, progress_interval=0)
+    elapsed = time.perf_counter() - start
+    bytes_written = sum(os.path.getsize(os.path.join(output_dir, path)) for path in mirrored_files(output_dir))
+    return {
+        'pages': len(mirror.visited_urls),
+        'crawl_seconds': round(elapsed, 2),
+        'crawl_pages_per_sec': round(len(mirror.visited_urls) / elapsed, 1),
+        'crawl_peak_rss_mb': peak_rss_mb(),
+        'bytes_written': bytes_written,
+        'errors': mirror.metrics.total('errors'),
+        'retries': mirror.metrics.total('retries'),
+    }
+
+
+def suite_extract(target_directory, workers):
+    start = time.perf_counter()
+    posts = process_nested_directories(target_directory, workers=workers)
+    elapsed = time.perf_counter() - start
+    rss = [value for value in (peak_rss_mb(), peak_rss_mb('children')) if value is not None]
+    return {
+        'posts': len(posts),
+        'extract_seconds': round(elapsed, 2),
+        'extract_posts_per_sec': round(len(posts) / elapsed, 1),
+        'extract_peak_rss_mb': max(rss) if rss else None,
+    }
+
+
+def benchmark_suite(board, latency, server_rate, workers, rate_limit, extract_workers):
+    """
+    Mirror a fixture board and extract its posts, each in its own process.
+    :param server_rate: Requests per second the fixture server accepts before answering 429 (None for no limit)
+    :return: Dict of measurements
+    """
+    server = start_fixture_server(board, latency=latency, rate_limit=server_rate)
+    try:
+        with tempfile.TemporaryDirectory() as output_dir:
+            results = run_in_process(suite_crawl, server.base_url, output_dir, workers, rate_limit)
+            results.update(run_in_process(suite_extract, os.path.join(output_dir, 'forum'), extract_workers))
+    finally:
+        server.shutdown()
+    results['server_throttled'] = server.rate_limit.throttled if server.rate_limit else 0
+    return results
+
+
+def current_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def store_result(results_file, config, results, label=None):
+    """
+    Append a run to the results file and compare it with the previous run of the same configuration.
+    :return: The previous run's results, or None
+    """
+    previous = None
+    if os.path.exists(results_file):
+        with open(results_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                record = json.loads(line)
+                if record['config'] == config:
+                    previous = record
+    record = {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': current_commit(),
+        'label': label,
+        'config': config,
+        'results': results,
+    }
+    with open(results_file, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record) + '\n')
+    return previous
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks against a local fixture board")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    fetch_parser = subparsers.add_parser('fetch', help="Compare fetch engine throughput")
+    fetch_parser.add_argument('--engine', choices=FETCH_ENGINES + ('all',), default='all')
+    fetch_parser.add_argument('--pages', type=int, default=200)
+
+    drivers_parser = subparsers.add_parser('drivers', help="Selenium throughput by driver pool size")
+    drivers_parser.add_argument('--sizes', default='1,2,4', help="Comma separated pool sizes")
+    drivers_parser.add_argument('--pages', type=int, default=100)
+    drivers_parser.add_argument('--latency', type=float, default=0.05, help="Simulated response latency in seconds")
+
+    crawl_parser = subparsers.add_parser('crawl', help="Measure crawl scaling with the number of workers")
+    crawl_parser.add_argument('--workers', default='1,2,4,8', help="Comma separated worker counts")
+    crawl_parser.add_argument('--latency', type=float, default=0.05, help="Simulated response latency in seconds")
+    crawl_parser.add_argument('--rate', type=float, default=100.0, help="Politeness cap in requests per second")
+
+    frontier_parser = subparsers.add_parser('frontier', help="Frontier push/pop cost as the crawl grows")
+    frontier_parser.add_argument('--sizes', default='10000,100000,1000000,4000000',
+                                 help="Comma separated numbers of URLs")
+    frontier_parser.add_argument('--list-limit', type=int, default=200000,
+                                 help="Largest size to also run the old list queue for")
+
+    urls_parser = subparsers.add_parser('urls', help="Memory of the crawl's URL sets and queue by URL index")
+    urls_parser.add_argument('--count', type=int, default=1000000, help="Number of URLs")
+
+    parse_parser = subparsers.add_parser('parse', help="Per-page parse cost of the page pipeline")
+    parse_parser.add_argument('--corpus', help="Directory of saved topic pages (default: fixture pages)")
+    parse_parser.add_argument('--pages', type=int, default=200)
+
+    profiles_parser = subparsers.add_parser('profiles', help="Post extraction speed, before and with profiles")
+    profiles_parser.add_argument('--corpus', help="Directory of saved topic pages (default: fixture pages)")
+    profiles_parser.add_argument('--pages', type=int, default=200)
+    profiles_parser.add_argument('--profile', help="Theme profile (default: detected per page)")
+
+    extract_parser = subparsers.add_parser('extract', help="Extraction throughput by number of processes")
+    extract_parser.add_argument('--corpus', help="Mirrored forum directory (default: generated fixture corpus)")
+    extract_parser.add_argument('--workers', default='1,2,4', help="Comma separated process counts")
+    extract_parser.add_argument('--topics', type=int, default=100, help="Topics per section of the generated corpus")
+
+    links_parser = subparsers.add_parser('links', help="Link rewriting throughput by number of processes")
+    links_parser.add_argument('--workers', default='1,2,4', help="Comma separated process counts")
+    links_parser.add_argument('--topics', type=int, default=300, help="Topics per section of the generated mirror")
+
+    suite_parser = subparsers.add_parser('suite', help="Crawl and extract a fixture board, recording the results")
+    suite_parser.add_argument('--sections', type=int, default=3)
+    suite_parser.add_argument('--topics', type=int, default=30, help="Topics per section")
+    suite_parser.add_argument('--posts', type=int, default=25, help="Posts per topic")
+    suite_parser.add_argument('--topics-per-page', type=int, default=25)
+    suite_parser.add_argument('--posts-per-page', type=int, default=10)
+    suite_parser.add_argument('--avatars', type=int, default=7, help="Distinct avatar images shared by the posts")
+    suite_parser.add_argument('--latency', type=float, default=0.05, help="Simulated response latency in seconds")
+    suite_parser.add_argument('--server-rate', type=float,
+                              help="Requests per second the fixture server accepts before answering 429")
+    suite_parser.add_argument('--workers', type=int, default=4, help="Crawl workers")
+    suite_parser.add_argument('--rate', type=float, default=100.0, help="Crawler politeness cap in requests per second")
+    suite_parser.add_argument('--extract-workers', type=int, default=1, help="Extraction processes")
+    suite_parser.add_argument('--results', default='benchmark_results.jsonl', help="File the runs are appended to")
+    suite_parser.add_argument('--label', help="Note stored with the run, e.g. the change being measured")
+
+    args = parser.parse_args()
+
+    if args.command == 'fetch':
+        engines = FETCH_ENGINES if args.engine == 'all' else (args.engine,)
+        for engine in engines:
+            rate = benchmark_fetch(engine, args.pages)
+            print(f"{engine:>10}: {rate:8.1f} pages/sec")
+
+    elif args.command == 'drivers':
+        for size in [int(n) for n in args.sizes.split(',')]:
+            print(f"{size:>3} browsers: {benchmark_drivers(size, args.pages, args.latency):8.1f} pages/sec")
+
+    elif args.command == 'crawl':
+        serial_files = None
+        for workers in [int(n) for n in args.workers.split(',')]:
+            rate, files = benchmark_crawl(workers, args.latency, args.rate)
+            if serial_files is None:
+                serial_files = files
+            identical = 'identical' if files == serial_files else 'DIFFERENT'
+            print(f"{workers:>3} workers: {rate:8.1f} pages/sec ({len(files)} files, {identical})")
+
+    elif args.command == 'frontier':
+        for size in [int(n) for n in args.sizes.split(',')]:
+            line = f"{size:>9} URLs: frontier {benchmark_frontier(size):7.0f} ns/op"
+            if size <= args.list_limit:
+                line += f", list.pop(0) {benchmark_list_queue(size):9.0f} ns/op"
+            print(line)
+
+    elif args.command == 'urls':
+        rows = benchmark_url_index(args.count)
+        print(f"{f'{args.count} URLs':<24}{'python':>12}{'compact':>12}{'disk':>12}")
+        for name, sizes in rows + [('total', {mode: sum(sizes[mode] for _, sizes in rows)
+                                              for mode in ('python', 'compact', 'disk')})]:
+            print(f"{name:<24}" + ''.join(f"{sizes[mode] / 1e6:>9.1f} MB" for mode in ('python', 'compact', 'disk')))
+
+    elif args.command == 'parse':
+        corpus = load_parse_corpus(args.corpus, args.pages)
+        print(f"{'before':>12}: {benchmark_parse(corpus):8.1f} pages/sec")
+        for backend in PARSER_BACKENDS:
+            if resolve_backend(backend) == backend:
+                print(f"{backend:>12}: {benchmark_parse(corpus, backend):8.1f} pages/sec")
+
+    elif args.command == 'profiles':
+        before, after, identical = benchmark_profiles(load_parse_corpus(args.corpus, args.pages), args.profile)
+        print(f"{'before':>12}: {before:8.1f} posts/sec")
+        print(f"{'profiles':>12}: {after:8.1f} posts/sec ({'same' if identical else 'different'} posts)")
+
+    elif args.command == 'extract':
+        with tempfile.TemporaryDirectory() as corpus_dir:
+            if args.corpus:
+                corpus_dir = args.corpus
+            else:
+                write_fixture_corpus(FixtureBoard(topics_per_section=args.topics), corpus_dir)
+            for workers in [int(n) for n in args.workers.split(',')]:
+                rate, post_count = benchmark_extract(corpus_dir, workers)
+                print(f"{workers:>3} processes: {rate:8.1f} posts/sec ({post_count} posts)")
+
+    elif args.command == 'links':
+        with tempfile.TemporaryDirectory() as corpus_dir:
+            write_fixture_corpus(FixtureBoard(topics_per_section=args.topics), os.path.join(corpus_dir, 'forum'))
+            for workers in [int(n) for n in args.workers.split(',')]:
+                rate, pages = benchmark_links(corpus_dir, workers)
+                print(f"{workers:>3} processes: {rate:8.1f} pages/sec ({pages} pages)")
+
+    elif args.command == 'suite':
+        config = {key: getattr(args, key) for key in ('sections', 'topics', 'posts', 'topics_per_page', 'posts_per_page',
+                                                     'avatars', 'latency', 'server_rate', 'workers', 'rate',
+                                                     'extract_workers')}
+        board = FixtureBoard(sections=args.sections, topics_per_section=args.topics, posts_per_topic=args.posts,
+                             topics_per_page=args.topics_per_page, posts_per_page=args.posts_per_page,
+                             avatars=args.avatars)
+        results = benchmark_suite(board, args.latency, args.server_rate, args.workers, args.rate,
+                                  args.extract_workers)
+        previous = store_result(args.results, config, results, args.label)
+        for key, value in results.items():
+            line = f"{key:>22}: {value}"
+            before = previous['results'].get(key) if previous else None
+            if isinstance(value, (int, float)) and isinstance(before, (int, float)) and before:
+                line += f"  ({(value - before) / before:+.1%} vs {previous['commit'] or previous['time']})"
+            print(line)
@@ -0,0 +1,126 @@
+from frontier import Frontier
+
+import threading
+import sqlite3
+import logging
+import time
+
+PENDING = 0
+VISITED = 1
+
+
+class CrawlState:
+    """
+    Durable crawl state in SQLite: the pending and visited URLs of the frontier.
+    Updates are buffered in memory and written in one transaction per batch, so
+    a crash loses at most one batch, which is simply fetched again on resume.
+    """
+
+    def __init__(self, path, batch_size=1000, flush_interval=5.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS urls (
+                key TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                priority INTEGER NOT NULL DEFAULT 0,
+                state INTEGER NOT NULL
+            );
+        """)
+        self.pending_urls = []
+        self.visited_keys = []
+        self.last_flush = time.monotonic()
+
+    def add_pending(self, key, url, priority):
+        with self.lock:
+            self.pending_urls.append((key, url, priority))
+            self.maybe_flush()
+
+    def mark_visited(self, key, url):
+        with self.lock:
+            self.visited_keys.append((key, url))
+            self.maybe_flush()
+
+    def maybe_flush(self):
+        buffered = len(self.pending_urls) + len(self.visited_keys)
+        if buffered >= self.batch_size or time.monotonic() - self.last_flush >= self.flush_interval:
+            self.write_batch()
+
+    def flush(self):
+        with self.lock:
+            self.write_batch()
+
+    def write_batch(self):
+        with self.connection:
+            self.connection.executemany(
+                'INSERT OR IGNORE INTO urls (key, url, priority, state) VALUES (?, ?, ?, 0)', self.pending_urls)
+            self.connection.executemany(
+                'INSERT INTO urls (key, url, state) VALUES (?, ?, 1) '
+                'ON CONFLICT(key) DO UPDATE SET state = 1', self.visited_keys)
+        self.pending_urls = []
+        self.visited_keys = []
+        self.last_flush = time.monotonic()
+
+    def load_urls(self, state):
+        """Yield (key, url, priority) of every URL in the given state"""
+        return self.connection.execute('SELECT key, url, priority FROM urls WHERE state = ? ORDER BY rowid', (state,))
+
+    def reset(self):
+        """Forget everything, so the next crawl starts from the root again"""
+        with self.lock:
+            self.pending_urls = []
+            self.visited_keys = []
+            with self.connection:
+                self.connection.execute('DELETE FROM urls')
+
+    def close(self):
+        self.flush()
+        self.connection.close()
+
+
+class JournaledFrontier(Frontier):
+    """
+    A Frontier that records every newly queued URL in a CrawlState, and every
+    processed URL once the URLs it led to are recorded, so that no batch can
+    hold a visited page without the pages it discovered. A URL that failed stays
+    pending, so a resumed crawl fetches it again.
+    """
+
+    def __init__(self, state, **kwargs):
+        super().__init__(**kwargs)
+        self.state = state
+
+    def add(self, key, url, priority):
+        if not super().add(key, url, priority):
+            return False
+        self.state.add_pending(key, url, priority)
+        return True
+
+    def done(self, url):
+        self.state.mark_visited(self.key(url), url)
+
+    def restore(self, visited=None, found=None):
+        """
+        Reload a previous crawl: visited URLs only enter the dedup index,
+        pending ones are queued again.
+        :param visited: Set to add the visited URLs to
+        :param found: Called with every journaled URL, visited or pending
+        :return: The visited URLs
+        """
+        visited = set() if visited is None else visited
+        for key, url, _ in self.state.load_urls(VISITED):
+            self.seen.add(self.index_key(key))
+            visited.add(url)
+            if found is not None:
+                found(url)
+        for key, url, priority in self.state.load_urls(PENDING):
+            Frontier.add(self, key, url, priority)
+            if found is not None:
+                found(url)
+        logging.info(f"Restored crawl state: {len(self)} pending, {len(visited)} visited")
+        return visited
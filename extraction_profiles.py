@@ -0,0 +1,242 @@
+from functools import lru_cache
+
+import os
+import re
+import json
+import soupsieve
+
+# Where the post fields are on each theme. A field lists rules tried in order until one
+# finds a value, then falls back to the profile's default. A rule is a CSS selector
+# (relative to the post; the text of the first match) or a dict with:
+#   select  - CSS selector relative to the post (or page, for page_fields)
+#   closest - CSS selector of an ancestor of the post, instead of select
+#   attr    - take this attribute instead of the text
+#   text    - 'strip' (default), 'raw' or 'words' (text nodes joined by single spaces)
+#   regex   - keep group 1 (or the whole match) of the first match in the value
+PROFILES = {
+    # The bootstrap-based theme of our first board
+    'bootstrap': {
+        'post': 'article[role="article"]',
+        'page_fields': {
+            'topic_title': [{'select': 'head title', 'text': 'raw'}],
+        },
+        'fields': {
+            'post_id': [{'closest': 'div.clearfix', 'attr': 'id'}],
+            'post_title': [{'select': 'div.panel-heading h3 a', 'text': 'raw'}],
+            'author': ['div.panel-heading a.username-coloured', 'div.panel-heading span.username-coloured'],
+            'content': [{'select': 'div.panel-body div.content', 'text': 'words'}],
+            'timestamp': ['div.panel-heading span.hidden-xs'],
+        },
+        'defaults': {'topic_title': 'No Title', 'author': 'Author not found'},
+        # The date phpBB appends to edited posts
+        'strip': {'content': r"- (Thứ \d|Chủ nhật) Tháng \d{1,2} \d{2}, \d{4} \d{1,2}:\d{2} (am|pm)"},
+    },
+    # phpBB's default theme, 3.0 to 3.3
+    'prosilver': {
+        'post': 'div.post',
+        'page_fields': {
+            'topic_title': ['h2.topic-title a', 'h2.topic-title', {'select': 'head title', 'text': 'raw'}],
+        },
+        'fields': {
+            'post_id': [{'attr': 'id'}],
+            'post_title': ['div.postbody h3 a'],
+            'author': ['div.postbody p.author a.username-coloured', 'div.postbody p.author a.username',
+                       'dl.postprofile a.username-coloured', 'dl.postprofile a.username'],
+            'content': [{'select': 'div.postbody div.content', 'text': 'words'}],
+            'timestamp': ['div.postbody p.author time', {'select': 'div.postbody p.author', 'regex': r'»\s*(.+)$'}],
+        },
+        'defaults': {'topic_title': 'No Title', 'author': 'Author not found'},
+    },
+}
+
+# One compound selector of the fast path: tag, at most one class and attribute tests
+STEP_RE = re.compile(r'^([a-zA-Z][\w-]*)?(?:\.([\w-]+))?((?:\[[\w-]+(?:="[^"]*")?\])*)$')
+ATTRIBUTE_RE = re.compile(r'\[([\w-]+)(?:="([^"]*)")?\]')
+
+
+def step_matcher(name, class_name, attributes):
+    """A plain function testing one compound selector, much cheaper per element than a bs4 filter"""
+    def matches(element):
+        if element.name is None or (name is not None and element.name != name):
+            return False
+        attrs = element.attrs
+        if class_name is not None:
+            classes = attrs.get('class') or ()
+            if class_name not in (classes.split() if isinstance(classes, str) else classes):
+                return False
+        for key, value in attributes:
+            if key not in attrs or (value is not None and attrs[key] != value):
+                return False
+        return True
+    return matches
+
+
+class Selector:
+    """
+    A CSS selector compiled once. A chain of simple steps ('div.panel-heading h3 a')
+    is matched by precompiled tests while walking the tree, each step searching
+    within the first match of the previous one, and the elements found for a
+    chain's prefix are shared by the selectors of one post. Anything else goes
+    through soupsieve.
+    """
+
+    def __init__(self, selector):
+        self.selector = selector
+        self.pattern = soupsieve.compile(selector)
+        self.steps = []
+        parts = selector.split()
+        for i, part in enumerate(parts):
+            match = STEP_RE.match(part)
+            if not match:
+                self.steps = None
+                break
+            name, class_name, attribute_tests = match.groups()
+            attributes = [(key, value or None) for key, value in ATTRIBUTE_RE.findall(attribute_tests)]
+            self.steps.append((step_matcher(name and name.lower(), class_name, attributes), ' '.join(parts[:i + 1])))
+
+    def first(self, element, found=None):
+        """
+        :param found: Elements found so far within the same post, keyed by selector prefix
+        """
+        if self.steps is None:
+            return self.pattern.select_one(element)
+        for matches, key in self.steps:
+            if found is not None and key in found:
+                element = found[key]
+            else:
+                element = next((e for e in element.descendants if matches(e)), None)
+                if found is not None:
+                    found[key] = element
+            if element is None:
+                return None
+        return element
+
+    def all(self, element):
+        if self.steps is not None and len(self.steps) == 1:
+            matches = self.steps[0][0]
+            return [e for e in element.descendants if matches(e)]
+        return self.pattern.select(element)
+
+    def closest(self, element):
+        if self.steps is not None and len(self.steps) == 1:
+            matches = self.steps[0][0]
+            return next((e for e in element.parents if matches(e)), None)
+        return self.pattern.closest(element.parent) if element.parent is not None else None
+
+    def match(self, element):
+        return self.pattern.match(element)
+
+
+class FieldRule:
+    """One way of finding a field's value; see PROFILES"""
+
+    def __init__(self, rule):
+        if isinstance(rule, str):
+            rule = {'select': rule}
+        self.select = Selector(rule['select']) if rule.get('select') else None
+        self.closest = Selector(rule['closest']) if rule.get('closest') else None
+        self.attr = rule.get('attr')
+        self.text = rule.get('text', 'strip')
+        self.regex = re.compile(rule['regex']) if rule.get('regex') else None
+
+    def apply(self, element, found=None):
+        if self.closest is not None:
+            element = self.closest.closest(element)
+        elif self.select is not None:
+            element = self.select.first(element, found)
+        if element is None:
+            return None
+        if self.attr:
+            value = element.get(self.attr)
+        elif self.text == 'words':
+            value = ' '.join(element.stripped_strings)
+        elif self.text == 'raw':
+            value = element.get_text()
+        else:
+            value = element.get_text().strip()
+        if value is not None and self.regex is not None:
+            match = self.regex.search(value)
+            value = (match.group(1) if match.groups() else match.group()).strip() if match else None
+        return value
+
+
+def compile_rules(rules):
+    """FieldRules of a field, a comma separated selector giving one rule per alternative"""
+    compiled = []
+    for rule in rules:
+        selector = rule if isinstance(rule, str) else rule.get('select')
+        if selector and ',' in selector:
+            for alternative in selector.split(','):
+                compiled.append(FieldRule(alternative.strip() if isinstance(rule, str)
+                                          else dict(rule, select=alternative.strip())))
+        else:
+            compiled.append(FieldRule(rule))
+    return compiled
+
+
+class ExtractionProfile:
+    """A theme layout from PROFILES with its selectors and regexes compiled."""
+
+    def __init__(self, name, spec):
+        self.name = name
+        self.post = Selector(spec['post'])
+        self.page_fields = {field: compile_rules(rules) for field, rules in spec.get('page_fields', {}).items()}
+        self.fields = {field: compile_rules(rules) for field, rules in spec['fields'].items()}
+        self.defaults = spec.get('defaults', {})
+        self.strip = {field: re.compile(pattern) for field, pattern in spec.get('strip', {}).items()}
+
+    def value(self, field, rules, element, found=None):
+        for rule in rules:
+            value = rule.apply(element, found)
+            if value is not None:
+                strip = self.strip.get(field)
+                return strip.sub('', value).strip() if strip is not None else value
+        return self.defaults.get(field)
+
+    def extract(self, soup, topic_id, posts=None):
+        """
+        :param posts: The page's post elements, if already collected
+        :return: A list of dictionaries with structured data for each post
+        """
+        page = {'topic_id': topic_id}
+        for field, rules in self.page_fields.items():
+            page[field] = self.value(field, rules, soup)
+        records = []
+        for post in self.post.all(soup) if posts is None else posts:
+            found = {}
+            record = dict(page)
+            for field, rules in self.fields.items():
+                record[field] = self.value(field, rules, post, found)
+            records.append(record)
+        return records
+
+
+@lru_cache(maxsize=None)
+def named_profile(name):
+    """A profile of PROFILES, or one stored as JSON in the file `name`, compiled once per process"""
+    if name in PROFILES:
+        return ExtractionProfile(name, PROFILES[name])
+    with open(name, 'r', encoding='utf-8') as f:
+        spec = json.load(f)
+    return ExtractionProfile(os.path.splitext(os.path.basename(name))[0], spec)
+
+
+def get_profile(profile):
+    """
+    :param profile: None, a name of PROFILES, the path of a JSON profile, a spec dict or an ExtractionProfile
+    :return: The compiled profile, or None to detect it per page
+    """
+    if profile is None or isinstance(profile, ExtractionProfile):
+        return profile
+    if isinstance(profile, dict):
+        return ExtractionProfile(profile.get('name', 'custom'), profile)
+    return named_profile(profile)
+
+
+def detect_profile(soup, posts=None):
+    """The first profile whose post selector matches the page (or its collected post elements)"""
+    for name in PROFILES:
+        profile = named_profile(name)
+        if profile.post.match(posts[0]) if posts else profile.post.first(soup) is not None:
+            return profile
+    return named_profile(next(iter(PROFILES)))
@@ -0,0 +1,268 @@
+from requests.adapters import HTTPAdapter
+from contextlib import contextmanager
+
+import os
+import pickle
+import logging
+import requests
+import threading
+
+# Markers of pages that only render their content once JavaScript has run
+# (anti-bot interstitials, JS-only login walls, ...).
+JAVASCRIPT_MARKERS = (
+    'enable javascript',
+    'cf-browser-verification',
+    'challenge-platform',
+    'jschl-answer',
+)
+# Statuses anti-bot interstitials are served with
+CHALLENGE_STATUSES = (403, 503)
+
+
+def http_status(error):
+    """Return the HTTP status code carried by a requests exception, if any"""
+    response = getattr(error, 'response', None)
+    return response.status_code if response is not None else None
+
+
+def needs_javascript(html_content):
+    """Check whether fetched HTML has to be rendered by a real browser"""
+    if not html_content or '<body' not in html_content.lower():
+        return True
+    lowered = html_content.lower()
+    return any(marker in lowered for marker in JAVASCRIPT_MARKERS)
+
+
+def is_challenge(response):
+    """Check whether an error response is an anti-bot challenge page that a browser gets past"""
+    if response is None or response.status_code not in CHALLENGE_STATUSES:
+        return False
+    lowered = response.text.lower()
+    return any(marker in lowered for marker in JAVASCRIPT_MARKERS)
+
+
+class HttpFetcher:
+    """Fetch pages over a pooled requests.Session sharing the login cookies."""
+
+    def __init__(self, pool_size=10, timeout=30, cookies_file='cookies.pkl'):
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        if cookies_file and os.path.exists(cookies_file):
+            with open(cookies_file, 'rb') as f:
+                self.load_cookies(pickle.load(f))
+
+    def load_cookies(self, cookies):
+        """Copy Selenium cookie dicts (as returned by driver.get_cookies()) into the session"""
+        for cookie in cookies:
+            self.session.cookies.set(
+                cookie['name'],
+                cookie['value'],
+                domain=cookie.get('domain'),
+                path=cookie.get('path', '/'),
+            )
+        logging.info(f"Loaded {len(cookies)} cookies into HTTP session")
+
+    def fetch(self, url):
+        response = self.session.get(url, timeout=self.timeout)
+        response.raise_for_status()
+        return response.text
+
+    def close(self):
+        self.session.close()
+
+
+class DriverPool:
+    """
+    A bounded pool of WebDrivers sharing one login session. Drivers are started
+    on demand, checked for health on checkout, and quit and replaced after
+    max_pages pages or when they crash, which bounds the browsers' memory growth.
+    """
+
+    def __init__(self, create_driver, size=2, max_pages=200):
+        self.create_driver = create_driver
+        self.size = size
+        self.max_pages = max_pages
+        self.condition = threading.Condition()
+        self.idle = []
+        self.created = 0
+        self.page_counts = {}
+        self.cookies = []
+        self.cookie_url = None
+        self.recycled = 0
+        self.closed = False
+
+    def set_cookies(self, cookies, url):
+        """Remember the login cookies and inject them into every idle driver"""
+        with self.condition:
+            self.cookies = list(cookies)
+            self.cookie_url = url
+            idle = list(self.idle)
+        for driver in idle:
+            self.inject_cookies(driver)
+
+    def inject_cookies(self, driver):
+        if not self.cookies:
+            return
+        # Cookies can only be set for the domain the browser is currently on
+        driver.get(self.cookie_url)
+        for cookie in self.cookies:
+            driver.add_cookie({k: v for k, v in cookie.items() if v is not None})
+
+    def new_driver(self):
+        driver = self.create_driver()
+        self.inject_cookies(driver)
+        self.page_counts[id(driver)] = 0
+        return driver
+
+    def is_healthy(self, driver):
+        try:
+            driver.execute_script('return 1')
+            return True
+        except Exception:
+            return False
+
+    def checkout(self):
+        """Take an idle driver, start a new one if below size, or wait for one to be returned"""
+        while True:
+            with self.condition:
+                while not self.idle and self.created >= self.size:
+                    self.condition.wait()
+                if self.idle:
+                    driver = self.idle.pop()
+                else:
+                    driver = None
+                    self.created += 1
+
+            if driver is None:
+                try:
+                    return self.new_driver()
+                except Exception:
+                    with self.condition:
+                        self.created -= 1
+                        self.condition.notify()
+                    raise
+            if self.is_healthy(driver):
+                return driver
+            logging.warning("Discarding unresponsive WebDriver")
+            self.discard(driver)
+
+    def checkin(self, driver, failed=False):
+        """Return a driver; it is recycled after max_pages pages or if it stopped responding"""
+        with self.condition:
+            self.page_counts[id(driver)] = self.page_counts.get(id(driver), 0) + 1
+            worn_out = self.page_counts[id(driver)] >= self.max_pages
+        if worn_out or self.closed or (failed and not self.is_healthy(driver)):
+            self.discard(driver)
+            return
+        with self.condition:
+            self.idle.append(driver)
+            self.condition.notify()
+
+    def discard(self, driver):
+        try:
+            driver.quit()
+        except Exception as e:
+            logging.warning(f"Failed to quit WebDriver: {str(e)}")
+        with self.condition:
+            self.created -= 1
+            self.recycled += 1
+            self.page_counts.pop(id(driver), None)
+            self.condition.notify()
+
+    @contextmanager
+    def driver(self):
+        driver = self.checkout()
+        failed = False
+        try:
+            yield driver
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self.checkin(driver, failed)
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            idle, self.idle = self.idle, []
+        for driver in idle:
+            self.discard(driver)
+
+
+class SeleniumFetcher:
+    """Fetch pages through a pool of WebDrivers, for pages that need JavaScript."""
+
+    def __init__(self, pool, base_url, waiter):
+        self.pool = pool
+        self.base_url = base_url
+        self.waiter = waiter
+
+    def fetch(self, url):
+        with self.pool.driver() as driver:
+            # On a final timeout, keep whatever has rendered rather than losing the page
+            self.waiter.load(driver, url)
+            return driver.page_source
+
+    def load_cookies(self, cookies):
+        self.pool.set_cookies(cookies, self.base_url)
+
+    def close(self):
+        self.pool.close()
+
+
+class FallbackFetcher:
+    """Try the HTTP fetcher first and hand the page to Selenium only when required."""
+
+    def __init__(self, primary, fallback):
+        self.primary = primary
+        self.fallback = fallback
+        self.fallback_count = 0
+        self.lock = threading.Lock()
+
+    def fetch(self, url):
+        try:
+            html_content = self.primary.fetch(url)
+        except Exception as e:
+            # Dead links, server errors, throttling and timeouts go to the caller's error handling
+            # and retries; a browser only helps past an anti-bot challenge
+            if not is_challenge(getattr(e, 'response', None)):
+                raise
+            logging.info(f"HTTP {http_status(e)} challenge page, falling back to Selenium: {url}")
+        else:
+            if not needs_javascript(html_content):
+                return html_content
+            logging.info(f"Page needs JavaScript, falling back to Selenium: {url}")
+        with self.lock:
+            self.fallback_count += 1
+        return self.fallback.fetch(url)
+
+    def load_cookies(self, cookies):
+        self.primary.load_cookies(cookies)
+        self.fallback.load_cookies(cookies)
+
+    def close(self):
+        self.primary.close()
+        self.fallback.close()
+
+
+FETCH_ENGINES = ('http', 'selenium')
+
+
+def create_fetcher(engine, driver_pool, base_url, waiter, cookies_file='cookies.pkl'):
+    """
+    Build the fetcher for a crawl.
+    :param engine: 'http' (pooled HTTP with Selenium fallback) or 'selenium'
+    :param driver_pool: DriverPool used for pages that need a browser
+    :param base_url: Forum URL, where the login cookies are injected into new drivers
+    :param waiter: ReadinessWaiter deciding when a rendered page is complete
+    :param cookies_file: Pickled Selenium cookies saved by perform_login
+    """
+    selenium_fetcher = SeleniumFetcher(driver_pool, base_url, waiter)
+    if engine == 'selenium':
+        return selenium_fetcher
+    if engine == 'http':
+        return FallbackFetcher(HttpFetcher(cookies_file=cookies_file), selenium_fetcher)
+    raise ValueError(f"Unknown fetch engine: {engine}")
@@ -0,0 +1,283 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from functools import lru_cache
+
+import threading
+import argparse
+import html
+import time
+import zlib
+
+# Minimal 1x1 GIF served for every image on the fixture board
+PIXEL_GIF = (
+    b'GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04\x01\x00'
+    b'\x00\x00\x00,\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;'
+)
+STYLESHEET = b'body { font-family: sans-serif; }\n'
+WEEKDAYS = ['Thứ 2', 'Thứ 3', 'Thứ 4', 'Thứ 5', 'Thứ 6', 'Thứ 7', 'Chủ nhật']
+
+
+class FixtureBoard:
+    """
+    A deterministic phpBB (prosilver/bootstrap) style board rendered in memory.
+    Pages are generated from their URL alone, so the same request always
+    returns the same static HTML.
+    """
+
+    def __init__(self, sections=3, topics_per_section=30, posts_per_topic=25,
+                 topics_per_page=25, posts_per_page=10, avatars=7):
+        """
+        :param avatars: Number of distinct avatar images shared by the posts, i.e. how well the asset cache can do
+        """
+        self.sections = sections
+        self.topics_per_section = topics_per_section
+        self.posts_per_topic = posts_per_topic
+        self.topics_per_page = topics_per_page
+        self.posts_per_page = posts_per_page
+        self.avatars = avatars
+
+    def topic_id(self, section, index):
+        return (section - 1) * self.topics_per_section + index + 1
+
+    def section_of_topic(self, topic):
+        return (topic - 1) // self.topics_per_section + 1
+
+    def timestamp(self, topic, post_index):
+        minutes = topic * 37 + post_index * 11
+        day = minutes // (24 * 60) % 28 + 1
+        hour = minutes // 60 % 12 + 1
+        return f"{WEEKDAYS[day % 7]} Tháng 3 {day:02d}, 2024 {hour}:{minutes % 60:02d} {'am' if day % 2 else 'pm'}"
+
+    def page_urls(self):
+        """Every page URL of the board, relative to the server root"""
+        urls = ['/']
+        for section in range(1, self.sections + 1):
+            for start in range(0, self.topics_per_section, self.topics_per_page):
+                urls.append(f'/viewforum.php?f={section}' + (f'&start={start}' if start else ''))
+            for index in range(self.topics_per_section):
+                topic = self.topic_id(section, index)
+                for start in range(0, self.posts_per_topic, self.posts_per_page):
+                    urls.append(f'/viewtopic.php?f={section}&t={topic}' + (f'&start={start}' if start else ''))
+        return urls
+
+    def layout(self, title, body):
+        return (
+            '<!DOCTYPE html>\n<html><head><meta charset="utf-8">'
+            f'<title>{html.escape(title)}</title>'
+            '<link href="./styles/prosilver/theme/stylesheet.css" rel="stylesheet">'
+            '</head><body>'
+            '<div class="navbar"><a href="./index.php">Board index</a>'
+            '<img src="./styles/prosilver/theme/images/site_logo.gif" alt="logo"></div>'
+            f'{body}</body></html>'
+        )
+
+    def pagination(self, base, total, per_page, start, noun):
+        """Render a phpBB style windowed pagination block"""
+        pages = max(1, (total + per_page - 1) // per_page)
+        current = start // per_page + 1
+        window = {1, pages} | set(range(max(1, current - 2), min(pages, current + 2) + 1))
+        items = []
+        for page in sorted(window):
+            offset = (page - 1) * per_page
+            href = base + (f'&amp;start={offset}' if offset else '')
+            if page == current:
+                items.append(f'<li class="active"><span>{page}</span></li>')
+            else:
+                items.append(f'<li><a href="{href}" role="button">{page}</a></li>')
+        return (
+            f'<div class="pagination">{total} {noun} &bull; Page {current} of {pages}'
+            f'<ul class="pagination">{"".join(items)}</ul></div>'
+        )
+
+    def render_index(self):
+        rows = ''.join(
+            f'<li class="row"><dl><dt><a href="./viewforum.php?f={section}" class="forumtitle">'
+            f'Section {section}</a></dt><dd class="topics">{self.topics_per_section}</dd></dl></li>'
+            for section in range(1, self.sections + 1)
+        )
+        return self.layout('Board index', f'<ul class="topiclist forums">{rows}</ul>')
+
+    def render_section(self, section, start):
+        rows = []
+        last = min(start + self.topics_per_page, self.topics_per_section)
+        for index in range(start, last):
+            topic = self.topic_id(section, index)
+            replies = self.posts_per_topic - 1
+            last_start = (self.posts_per_topic - 1) // self.posts_per_page * self.posts_per_page
+            rows.append(
+                '<li class="row"><dl>'
+                f'<dt><a href="./viewtopic.php?f={section}&amp;t={topic}" class="topictitle">Topic {topic}</a></dt>'
+                f'<dd class="posts">{replies} <dfn>Replies</dfn></dd>'
+                f'<dd class="views">{topic * 13} <dfn>Views</dfn></dd>'
+                '<dd class="lastpost"><span><dfn>Last post </dfn>by '
+                f'<a href="./memberlist.php?mode=viewprofile&amp;u={topic % 7 + 2}" class="username">user{topic % 7 + 2}</a> '
+                f'<a href="./viewtopic.php?f={section}&amp;t={topic}&amp;start={last_start}#p{topic * 1000 + replies}" '
+                'title="Go to last post"></a>'
+                f'<br />{self.timestamp(topic, replies)}</span></dd>'
+                '</dl></li>'
+            )
+        body = (
+            f'<h2 class="forum-title">Section {section}</h2>'
+            + self.pagination(f'./viewforum.php?f={section}', self.topics_per_section,
+                              self.topics_per_page, start, 'topics')
+            + f'<ul class="topiclist topics">{"".join(rows)}</ul>'
+        )
+        return self.layout(f'Section {section}', body)
+
+    def render_post(self, section, topic, index):
+        post_id = topic * 1000 + index
+        author = f'user{(topic + index) % 7 + 2}'
+        title = f'Topic {topic}' if index == 0 else f'Re: Topic {topic}'
+        smiley = '<img src="./images/smilies/icon_e_smile.gif" alt=":)">' if index % 3 == 0 else ''
+        return (
+            f'<div id="p{post_id}" class="post bg{index % 2 + 1} clearfix">'
+            '<article role="article"><div class="panel panel-default">'
+            f'<div class="panel-heading"><h3><a href="./viewtopic.php?p={post_id}#p{post_id}">{title}</a></h3>'
+            f'<p class="author">by <a href="./memberlist.php?mode=viewprofile&amp;u={(topic + index) % 7 + 2}" '
+            f'class="username-coloured">{author}</a> '
+            f'<span class="hidden-xs">{self.timestamp(topic, index)}</span></p></div>'
+            '<div class="panel-body">'
+            f'<img src="./download/file.php?avatar={(topic + index) % self.avatars + 2}.gif" class="avatar" alt="avatar">'
+            f'<div class="content">Post {index} of topic {topic} by {author}. {smiley} '
+            'Lorem ipsum dolor sit amet, consectetur adipiscing elit.</div>'
+            '</div></div></article></div>'
+        )
+
+    def render_topic(self, section, topic, start):
+        last = min(start + self.posts_per_page, self.posts_per_topic)
+        posts = ''.join(self.render_post(section, topic, index) for index in range(start, last))
+        body = (
+            f'<h2 class="topic-title"><a href="./viewtopic.php?f={section}&amp;t={topic}">Topic {topic}</a></h2>'
+            + self.pagination(f'./viewtopic.php?f={section}&amp;t={topic}', self.posts_per_topic,
+                              self.posts_per_page, start, 'posts')
+            + posts
+        )
+        return self.layout(f'Topic {topic}', body)
+
+    @lru_cache(maxsize=4096)
+    def render(self, path, query):
+        """
+        Render the page for a request.
+        :return: (status, content type, body bytes)
+        """
+        params = parse_qs(query)
+        start = int(params.get('start', ['0'])[0])
+        if path in ('/', '/index.php'):
+            return 200, 'text/html; charset=utf-8', self.render_index().encode('utf-8')
+        if path == '/viewforum.php':
+            section = int(params.get('f', ['0'])[0])
+            if 1 <= section <= self.sections:
+                return 200, 'text/html; charset=utf-8', self.render_section(section, start).encode('utf-8')
+        if path == '/viewtopic.php' and 't' in params:
+            topic = int(params['t'][0])
+            section = self.section_of_topic(topic)
+            if 1 <= section <= self.sections:
+                return 200, 'text/html; charset=utf-8', self.render_topic(section, topic, start).encode('utf-8')
+        if path.endswith('.css'):
+            return 200, 'text/css', STYLESHEET
+        if path.endswith('.gif') or path == '/download/file.php':
+            return 200, 'image/gif', PIXEL_GIF
+        return 404, 'text/html; charset=utf-8', self.layout('Not found', '<p>Not found</p>').encode('utf-8')
+
+
+class ServerRateLimit:
+    """Token bucket of the fixture server; requests above the rate are answered with 429 like a throttling forum."""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.burst = max(1.0, rate)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+        self.throttled = 0
+
+    def allow(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            self.throttled += 1
+            return False
+
+
+def make_handler(board, latency=0.0, rate_limit=None):
+    class FixtureHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            if latency:
+                time.sleep(latency)
+            if rate_limit is not None and not rate_limit.allow():
+                self.send_response(429)
+                self.send_header('Retry-After', '1')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            parsed = urlparse(self.path)
+            status, content_type, body = board.render(parsed.path, parsed.query)
+            etag = None
+            if not content_type.startswith('text/html'):
+                # Static assets support conditional requests like a real web server
+                etag = f'"{zlib.crc32(body):08x}"'
+                if self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            if etag:
+                self.send_header('ETag', etag)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return FixtureHandler
+
+
+def start_fixture_server(board, host='127.0.0.1', port=0, latency=0.0, rate_limit=None):
+    """
+    Serve a fixture board from a background thread.
+    :param latency: Seconds every response is delayed, to simulate a remote forum
+    :param rate_limit: Requests per second the server accepts before answering 429
+    :return: The running server; its base URL is server.base_url, its throttling in server.rate_limit
+    """
+    server_rate_limit = ServerRateLimit(rate_limit) if rate_limit else None
+    server = ThreadingHTTPServer((host, port), make_handler(board, latency, server_rate_limit))
+    server.rate_limit = server_rate_limit
+    server.daemon_threads = True
+    server.base_url = f'http://{host}:{server.server_address[1]}/'
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a synthetic phpBB board for local testing")
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--sections', type=int, default=3)
+    parser.add_argument('--topics', type=int, default=30, help="Topics per section")
+    parser.add_argument('--posts', type=int, default=25, help="Posts per topic")
+    parser.add_argument('--topics-per-page', type=int, default=25)
+    parser.add_argument('--posts-per-page', type=int, default=10)
+    parser.add_argument('--avatars', type=int, default=7, help="Distinct avatar images shared by the posts")
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds to delay every response")
+    parser.add_argument('--rate-limit', type=float, help="Requests per second accepted before answering 429")
+    args = parser.parse_args()
+
+    board = FixtureBoard(sections=args.sections, topics_per_section=args.topics, posts_per_topic=args.posts,
+                         topics_per_page=args.topics_per_page, posts_per_page=args.posts_per_page,
+                         avatars=args.avatars)
+    server = start_fixture_server(board, port=args.port, latency=args.latency, rate_limit=args.rate_limit)
+    print(f"Serving fixture board at {server.base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,83 @@
+from collections import deque
+
+from url_index import IntQueue, IntSet
+
+
+class Frontier:
+    """
+    Crawl frontier with a fixed number of priority classes, each a FIFO deque,
+    and an "enqueued-or-visited" index so every canonical URL is queued once.
+    push and pop are O(1) regardless of how many URLs have been seen.
+    """
+
+    def __init__(self, key=None, priority=None, priorities=1, interner=None, seen=None):
+        """
+        :param key: Callable mapping a URL to its canonical form (e.g. normalize_url)
+        :param priority: Callable mapping a URL to its class, 0 being served first
+        :param priorities: Number of priority classes
+        :param interner: URLInterner; the frontier then holds integer keys only, in an IntSet and
+            array-backed queues, and pop returns the URL rebuilt from its key
+        :param seen: Index to record the keys in (e.g. a DiskIntSet) instead of a new one
+        """
+        self.key = key or (lambda url: url)
+        self.priority = priority or (lambda url: 0)
+        self.interner = interner
+        self.queues = [deque() if interner is None else IntQueue() for _ in range(priorities)]
+        if seen is None:
+            seen = set() if interner is None else IntSet()
+        self.seen = seen
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, url):
+        key = self.key(url)
+        if self.interner is not None:
+            # A URL that was never interned cannot be in the index, and checking must not intern it
+            key = self.interner.lookup(key)
+            if key is None:
+                return False
+        return key in self.seen
+
+    def index_key(self, key):
+        """A canonical key as stored in the seen index"""
+        return key if self.interner is None else self.interner.intern(key)
+
+    def push(self, url):
+        """Queue a URL unless its canonical form was already queued or visited"""
+        return self.add(self.key(url), url, self.priority(url))
+
+    def add(self, key, url, priority):
+        """Queue a URL whose key and priority class are already known"""
+        item = url
+        if self.interner is not None:
+            key = item = self.interner.intern(key, url)
+        if key in self.seen:
+            return False
+        self.seen.add(key)
+        self.queues[priority].append(item)
+        self.size += 1
+        return True
+
+    def extend(self, urls):
+        return sum(self.push(url) for url in urls)
+
+    def pop(self):
+        """Return the next URL of the highest priority class, or None when empty"""
+        for queue in self.queues:
+            if queue:
+                self.size -= 1
+                item = queue.popleft()
+                return item if self.interner is None else self.interner.url(item)
+        return None
+
+    def done(self, url):
+        """Called once a popped URL has been processed and its new URLs added"""
+
+    def failed(self, url):
+        """Called instead of done when processing a popped URL failed; it is not queued again in this run"""
+
+    def more_expected(self):
+        """Whether URLs can still arrive after the crawl ran dry (only for frontiers shared between crawlers)"""
+        return False
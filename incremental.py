@@ -0,0 +1,57 @@
+from bs4 import BeautifulSoup
+
+import re
+import logging
+
+# A live topic link, or one pointed at the local copy by link_rewriter.py
+TOPIC_ID_RE = re.compile(r'[?&;]t=(\d+)|topic_(\d+)/')
+NUMBER_RE = re.compile(r'\d+')
+SECTION_PAGE_RE = re.compile(r'forum/section_[^/]+/index[^/]*\.html$')
+
+
+def parse_topic_stats(soup):
+    """
+    Read the topic list of a section page.
+    :param soup: Parsed viewforum.php page
+    :return: Dict of topic number -> (reply count, last post text)
+    """
+    stats = {}
+    for row in soup.find_all('li', class_='row'):
+        title = row.find('a', class_='topictitle')
+        if not title or not title.get('href'):
+            continue
+        match = TOPIC_ID_RE.search(title['href'])
+        if not match:
+            continue
+        posts = row.find('dd', class_='posts')
+        replies = NUMBER_RE.search(posts.get_text().replace(',', '').replace('.', '')) if posts else None
+        last_post = row.find('dd', class_='lastpost')
+        stats[match.group(1) or match.group(2)] = (
+            int(replies.group()) if replies else None,
+            ' '.join(last_post.stripped_strings) if last_post else None,
+        )
+    return stats
+
+
+def load_topic_baseline(storage):
+    """
+    Collect the topic stats of every section page saved by a previous run.
+    :param storage: Page storage of the mirror (see storage.py)
+    :return: Dict of topic number -> (reply count, last post text)
+    """
+    baseline = {}
+    for path in storage.paths('forum/'):
+        if SECTION_PAGE_RE.match(path):
+            baseline.update(parse_topic_stats(BeautifulSoup(storage.read(path), 'html.parser')))
+    logging.info(f"Loaded previous stats of {len(baseline)} topics")
+    return baseline
+
+
+def trailing_page_starts(old_replies, new_replies, per_page):
+    """
+    The start= offsets of the topic pages that can differ after replies were added:
+    the previous last page (it may have been partly filled) and every page after it.
+    """
+    old_last = old_replies // per_page * per_page
+    new_last = max(new_replies, old_replies) // per_page * per_page
+    return list(range(old_last, new_last + 1, per_page))
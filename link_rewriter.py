@@ -0,0 +1,319 @@
+from urllib.parse import urljoin
+from parallel import map_batches
+from storage import STORAGE_BACKENDS, open_archive, open_storage, page_path
+from url_index import board_prefix
+
+import os
+import re
+import html
+import json
+import sqlite3
+import logging
+import argparse
+
+# Saved page paths, as produced by storage.page_path
+PAGE_PATH_RE = re.compile(r'forum/section_([^/]+)/(?:index(?:_(\d+))?|topic_(\d+)/page_(\d+))\.html$')
+# The href of an anchor in a page serialized by BeautifulSoup (attributes always double quoted)
+HREF_RE = re.compile(r'(<a\s(?:[^>]*?\s)?href=")([^"]*)(")')
+
+PAGE_SCRIPTS = ('', 'index.php', 'viewforum.php', 'viewtopic.php')
+
+MISSING = 'missing'
+
+
+class LinkIndex:
+    """
+    The pages a mirror holds, keyed by what identifies them in a forum link
+    (section and start, or topic and start), so a link resolves to its local
+    path with one lookup instead of walking the file system.
+    """
+
+    def __init__(self, base_url, paths=()):
+        self.prefix = board_prefix(base_url)
+        # The board index is saved under the path of base_url, e.g. forum/index.html for https://example.com/forum/
+        self.root = page_path(base_url)
+        self.has_root = False
+        self.sections = set()
+        self.topics = {}  # Topic number -> section directory it is saved in
+        self.topic_pages = set()
+        self.size = 0
+        self.cache = {}
+        for path in paths:
+            self.add(path)
+
+    def __len__(self):
+        return self.size
+
+    def add(self, path):
+        if path == self.root:
+            self.has_root = True
+            self.size += 1
+            return
+        match = PAGE_PATH_RE.match(path)
+        if not match:
+            return
+        section, section_start, topic, topic_start = match.groups()
+        if topic is None:
+            self.sections.add((section, int(section_start or 0)))
+        else:
+            self.topics[int(topic)] = section
+            self.topic_pages.add((int(topic), int(topic_start)))
+        self.size += 1
+
+    def resolve(self, href):
+        """
+        Local path (relative to the mirror root) of the page a link points at.
+        :param href: Attribute value as saved, i.e. HTML escaped and relative to the board
+        :return: The path with the link's fragment, MISSING for a forum page the mirror does not hold,
+            or None for anything else (other scripts, other sites, links already rewritten)
+        """
+        target = self.cache.get(href, False)
+        if target is False:
+            target = self.cache[href] = self.lookup(href)
+            if len(self.cache) > 100000:
+                self.cache.clear()
+        return target
+
+    def lookup(self, href):
+        if not href or href[0] in '#?':
+            return None  # Links within the page itself
+        href = html.unescape(href)
+        if href.startswith(self.prefix):
+            rest = href[len(self.prefix):]
+        elif ':' in href or href.startswith(('/', '../')):
+            url = urljoin(self.prefix, href)
+            if not url.startswith(self.prefix):
+                return None
+            rest = url[len(self.prefix):]
+        else:
+            # phpBB links are relative to the board directory, where every page lives
+            rest = href[2:] if href.startswith('./') else href
+        rest, _, fragment = rest.partition('#')
+        script, _, query = rest.partition('?')
+        if script not in PAGE_SCRIPTS:
+            return None
+        params = {}
+        for param in query.split('&') if query else ():
+            name, _, value = param.partition('=')
+            params.setdefault(name, value)
+        start = params.get('start', '0')
+        start = int(start) if start.isdigit() else 0
+        if script in ('', 'index.php'):
+            if not self.has_root:
+                return MISSING
+            path = self.root
+        elif script == 'viewforum.php' and 'f' in params:
+            section = params['f']
+            if (section, start) not in self.sections:
+                return MISSING
+            path = f'forum/section_{section}/index.html' if not start else f'forum/section_{section}/index_{start}.html'
+        elif script == 'viewtopic.php' and params.get('t', '').isdigit():
+            topic = int(params['t'])
+            if (topic, start) not in self.topic_pages:
+                return MISSING
+            path = f'forum/section_{self.topics[topic]}/topic_{topic}/page_{start}.html'
+        else:
+            return None
+        return f"{path}#{html.escape(fragment)}" if fragment else path
+
+
+def rewrite_links(text, index, depth):
+    """
+    Point the internal links of a saved page at the local copies.
+    :param depth: Directory depth of the page below the mirror root
+    :return: (new text, links rewritten, links to forum pages the mirror does not hold)
+    """
+    up = '../' * depth
+    counts = [0, 0]
+
+    def replace(match):
+        target = index.resolve(match.group(2))
+        if target is None:
+            return match.group(0)
+        if target is MISSING:
+            counts[1] += 1
+            return match.group(0)
+        counts[0] += 1
+        return f'{match.group(1)}{up}{target}{match.group(3)}'
+
+    return HREF_RE.sub(replace, text), counts[0], counts[1]
+
+
+worker_index = None
+
+
+def init_worker(index):
+    global worker_index
+    worker_index = index
+
+
+def rewrite_pages(paths, output_dir, archive_dir=None):
+    """
+    Rewrite the links of a batch of pages with the index given to init_worker. Files
+    are replaced in place; pages of an archive are handed back for the parent to append.
+    :return: List of (path, new data for the archive or None, stat after rewriting or None, missing links)
+    """
+    index = worker_index
+    archive = open_archive(archive_dir) if archive_dir else None
+    results = []
+    for path in paths:
+        try:
+            if archive is not None:
+                data = archive.read(path)
+            else:
+                with open(os.path.join(output_dir, path), 'rb') as f:
+                    data = f.read()
+            text, rewritten, missing = rewrite_links(data.decode('utf-8'), index, path.count('/'))
+            if not rewritten:
+                results.append((path, None, None, missing))
+            elif archive is not None:
+                results.append((path, text.encode('utf-8'), None, missing))
+            else:
+                full_path = os.path.join(output_dir, path)
+                with open(full_path + '.tmp', 'wb') as f:
+                    f.write(text.encode('utf-8'))
+                os.replace(full_path + '.tmp', full_path)
+                stat = os.stat(full_path)
+                results.append((path, None, (stat.st_size, stat.st_mtime_ns), missing))
+        except Exception as e:
+            logging.error(f"Failed to rewrite links of {path}: {str(e)}")
+    return results
+
+
+class RewriteManifest:
+    """
+    Size and version of every page as the previous pass left it, and how many of
+    its forum links could not be resolved, so a later pass only visits new or
+    refetched pages, and pages with unresolved links once more pages are mirrored.
+    """
+
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS pages (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                version INTEGER NOT NULL,
+                missing INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+        """)
+
+    def plan(self, entries, index_size):
+        """
+        :param entries: (path, size, version) of every stored page
+        :param index_size: Number of pages in the LinkIndex of this pass
+        :return: Paths to rewrite
+        """
+        known = {path: (size, version, missing) for path, size, version, missing in
+                 self.connection.execute('SELECT path, size, version, missing FROM pages')}
+        row = self.connection.execute("SELECT value FROM meta WHERE key = 'index_size'").fetchone()
+        index_changed = row is None or int(row[0]) != index_size
+        todo = []
+        for path, size, version in entries:
+            previous = known.get(path)
+            if previous is None or previous[:2] != (size, version) or (previous[2] and index_changed):
+                todo.append(path)
+        return todo
+
+    def update(self, rows, index_size=None):
+        """
+        :param rows: List of (path, size, version, missing)
+        """
+        with self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO pages (path, size, version, missing) VALUES (?, ?, ?, ?)', rows)
+            if index_size is not None:
+                self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('index_size', ?)",
+                                        (str(index_size),))
+
+    def reset(self):
+        with self.connection:
+            self.connection.execute('DELETE FROM pages')
+            self.connection.execute('DELETE FROM meta')
+
+    def close(self):
+        self.connection.close()
+
+
+def stored_pages(storage, root='index.html'):
+    """
+    (path, size, version) of the board index and every forum page in storage.
+    :param root: Path of the board index, see LinkIndex.root
+    """
+    stat = storage.stat(root)
+    if stat is not None:
+        yield (root,) + tuple(stat[:2])
+    for path, size, version, _ in storage.entries('forum/'):
+        if path != root:
+            yield path, size, version
+
+
+def rewrite_mirror_links(output_dir, base_url, storage='directory', workers=None, batch_size=64, full=False):
+    """
+    Point the internal links of every saved page at the local copies, so the mirror
+    can be browsed offline. Links to pages the mirror does not hold keep their live
+    URL; they are resolved by a later pass once those pages are mirrored.
+    :param storage: Storage backend of the mirror, one of STORAGE_BACKENDS
+    :param workers: Number of worker processes (default: one per CPU); 1 runs in this process
+    :param full: Visit every page, not only those new or changed since the previous pass
+    :return: (pages visited, pages rewritten, links left pointing at pages not mirrored)
+    """
+    store = open_storage(storage, output_dir)
+    archive_dir = os.path.join(output_dir, 'archive') if storage == 'warc' else None
+    manifest = RewriteManifest(os.path.join(output_dir, 'link_rewrite.db'))
+    try:
+        if full:
+            manifest.reset()
+        entries = list(stored_pages(store, page_path(base_url)))
+        index = LinkIndex(base_url, (path for path, _, _ in entries))
+        todo = manifest.plan(entries, len(index))
+        sizes = {path: (size, version) for path, size, version in entries}
+        logging.info(f"Rewriting links of {len(todo)} of {len(entries)} pages")
+
+        rewritten = 0
+        missing_links = 0
+        for results in rewrite_parallel(output_dir, todo, index, workers, batch_size, archive_dir):
+            rows = []
+            for path, data, stat, missing in results:
+                if data is not None:
+                    store.write(path, store.url(path), data)
+                    stat = store.stat(path)[:2]
+                if data is not None or stat is not None:
+                    rewritten += 1
+                size, version = stat or sizes[path]
+                rows.append((path, size, version, missing))
+                missing_links += missing
+            manifest.update(rows)
+        manifest.update([], index_size=len(index))
+        return len(todo), rewritten, missing_links
+    finally:
+        manifest.close()
+        store.close()
+
+
+def rewrite_parallel(output_dir, paths, index, workers=None, batch_size=64, archive_dir=None):
+    """
+    Fans rewrite_pages out over a process pool that receives the index once per worker.
+    :return: Generator of result lists per batch, in completion order
+    """
+    return map_batches(rewrite_pages, paths, (output_dir, archive_dir), workers, batch_size,
+                       initializer=init_worker, initargs=(index,))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Point the links of the mirrored pages at the local copies")
+    parser.add_argument('--output', default='mirrored_forum', help="Mirror output directory")
+    parser.add_argument('--storage', choices=STORAGE_BACKENDS, default='directory')
+    parser.add_argument('--workers', type=int, help="Worker processes (default: one per CPU)")
+    parser.add_argument('--full', action='store_true', help="Visit every page, not only new or changed ones")
+    args = parser.parse_args()
+
+    with open('login_config.json', 'r') as f:
+        base_url = json.load(f)['base_url']
+    visited, rewritten, missing = rewrite_mirror_links(args.output, base_url, args.storage, args.workers,
+                                                       full=args.full)
+    print(f"Visited {visited} pages, rewrote {rewritten}; {missing} links point at pages not mirrored")
@@ -0,0 +1,138 @@
+from contextlib import contextmanager
+
+import os
+import json
+import time
+import logging
+import threading
+
+# Crawl stages timed per page type
+STAGES = ('throttle', 'fetch', 'wait', 'parse', 'assets', 'write')
+
+
+class CrawlMetrics:
+    """
+    Counters and per-stage timings of a crawl, keyed by page type. Reported as a
+    periodic progress line, a JSON summary and optionally a Prometheus text file.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.timings = {}
+        self.counters = {}
+        self.reporter = None
+        self.stop_event = threading.Event()
+
+    def record(self, stage, kind, elapsed):
+        with self.lock:
+            timing = self.timings.get((stage, kind))
+            if timing is None:
+                timing = self.timings[(stage, kind)] = [0, 0.0, 0.0]
+            timing[0] += 1
+            timing[1] += elapsed
+            if elapsed > timing[2]:
+                timing[2] = elapsed
+
+    @contextmanager
+    def timer(self, stage, kind):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, kind, time.perf_counter() - start)
+
+    def count(self, name, kind=None, amount=1):
+        key = (name, kind)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def total(self, name):
+        with self.lock:
+            return sum(value for (counter, _), value in self.counters.items() if counter == name)
+
+    def progress_line(self, queue_size):
+        elapsed = time.time() - self.started
+        pages = self.total('pages')
+        return (
+            f"{elapsed:7.0f}s: {pages} pages ({pages / elapsed if elapsed else 0:.1f}/s), queue {queue_size}, "
+            f"{self.total('errors')} errors, {self.total('retries')} retries, "
+            f"{self.total('bytes_written') / 1e6:.1f} MB written"
+        )
+
+    def summary(self, extra=None):
+        """
+        Everything recorded so far as a JSON-serializable dict.
+        :param extra: Other sections to include, e.g. the asset cache stats
+        """
+        with self.lock:
+            stages = {}
+            for (stage, kind), (count, total, longest) in sorted(self.timings.items()):
+                stages.setdefault(stage, {})[kind] = {
+                    'count': count,
+                    'total_seconds': round(total, 3),
+                    'avg_seconds': round(total / count, 4),
+                    'max_seconds': round(longest, 3),
+                }
+            counters = {}
+            for (name, kind), value in sorted(self.counters.items(), key=lambda item: (item[0][0], item[0][1] or '')):
+                counters.setdefault(name, {})[kind or 'all'] = value
+        summary = {
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started)),
+            'elapsed_seconds': round(time.time() - self.started, 3),
+            'stages': stages,
+            'counters': counters,
+        }
+        summary.update(extra or {})
+        return summary
+
+    def write_summary(self, path, extra=None):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.summary(extra), f, indent=2)
+
+    def write_prometheus(self, path):
+        """Write the metrics in Prometheus text format, atomically as the node_exporter textfile collector expects"""
+        lines = [
+            '# HELP forum_mirror_stage_seconds Time spent in each crawl stage.',
+            '# TYPE forum_mirror_stage_seconds summary',
+        ]
+        with self.lock:
+            for (stage, kind), (count, total, _) in sorted(self.timings.items()):
+                labels = f'stage="{stage}",page_type="{kind}"'
+                lines.append(f'forum_mirror_stage_seconds_sum{{{labels}}} {total:.6f}')
+                lines.append(f'forum_mirror_stage_seconds_count{{{labels}}} {count}')
+            names = sorted({name for name, _ in self.counters})
+            for name in names:
+                lines.append(f'# TYPE forum_mirror_{name}_total counter')
+                for (counter, kind), value in sorted(self.counters.items(), key=lambda item: (item[0][0], item[0][1] or '')):
+                    if counter == name:
+                        labels = f'{{page_type="{kind}"}}' if kind else ''
+                        lines.append(f'forum_mirror_{name}_total{labels} {value}')
+        lines.append(f'forum_mirror_start_time_seconds {self.started:.0f}')
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(temp_path, path)
+
+    def start_reporting(self, interval, queue_size, prometheus_file=None):
+        """
+        Log a progress line (and refresh the Prometheus file) every `interval` seconds.
+        :param queue_size: Callable returning the current frontier size
+        """
+        def report():
+            while not self.stop_event.wait(interval):
+                line = self.progress_line(queue_size())
+                logging.info(line)
+                print(line)
+                if prometheus_file:
+                    self.write_prometheus(prometheus_file)
+
+        self.stop_event.clear()
+        self.reporter = threading.Thread(target=report, name='progress', daemon=True)
+        self.reporter.start()
+
+    def stop_reporting(self):
+        self.stop_event.set()
+        if self.reporter is not None:
+            self.reporter.join()
+            self.reporter = None
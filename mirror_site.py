@@ -3,51 +3,174 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException
 from urllib.parse import urljoin, urlparse, parse_qs, urlunparse
 
 import os
-import time
-import requests
-from bs4 import BeautifulSoup
 import logging
 import pickle
 import json
 import re
+import zlib
+import argparse
+import threading
+
+from fetchers import FETCH_ENGINES, DriverPool, create_fetcher, http_status
+from scheduler import CrawlScheduler, HostRateLimiter, THROTTLE_STATUSES
+from crawl_state import CrawlState, JournaledFrontier
+from incremental import load_topic_baseline, parse_topic_stats, trailing_page_starts
+from assets import AssetCache
+from page_parser import PARSER_BACKENDS, pagination_starts, parse_page, resolve_backend
+from readiness import PAGE_LOAD_STRATEGIES, ReadinessWaiter, page_type
+from metrics import CrawlMetrics
+from storage import STORAGE_BACKENDS, open_storage, page_path
+from link_rewriter import rewrite_mirror_links
+from url_index import URL_INDEXES, CompactSet, DiskIntSet, IntSet, URLInterner, number_key
+
+COOKIES_FILE = 'cookies.pkl'
 
 class ForumMirror:
-    def __init__(self, base_url, output_dir, login_config=None):
+    def __init__(self, base_url, output_dir, login_config=None, engine='http',
+                 rate_limit=2.0, max_in_flight=4, max_retries=3, posts_per_page=10, asset_workers=8,
+                 parser='html.parser', extract_posts=False, driver_pool_size=2, driver_max_pages=200,
+                 headless=True, page_load_strategy='eager', ready_timeout=10, ready_retries=1,
+                 ready_conditions=None, log_level='INFO', storage='directory', url_index='compact',
+                 expected_urls=1000000, extraction_profile=None):
         self.base_url = base_url
         self.domain = urlparse(base_url).netloc
         self.output_dir = output_dir
-        self.visited_urls = set()
-        self.forum_sections = set()
-        self.topics = set()
-        self.login_config = login_config
         os.makedirs(self.output_dir, exist_ok=True)
-        self.setup_logging()
-        self.setup_driver()
+        # 'compact' keeps URLs as packed integer keys in arrays, 'disk' moves the URL sets to SQLite
+        # behind Bloom filters sized for expected_urls, 'python' uses plain sets of strings
+        self.url_index = url_index
+        self.expected_urls = expected_urls
+        self.url_index_file = os.path.join(self.output_dir, "url_index.db")
+        self.url_keys = URLInterner(base_url) if url_index != 'python' else None
+        self.disk_key_sets = []
+        if self.url_keys is None:
+            self.visited_urls = set()
+            self.forum_sections = set()
+            self.topics = set()
+        else:
+            self.visited_urls = CompactSet(self.url_key, self.new_key_set('visited'), lookup=self.known_url_key)
+            self.forum_sections = CompactSet(number_key)
+            self.topics = CompactSet(number_key)
+        self.login_config = login_config
+        self.lock = threading.Lock()
+        self.rate_limiter = HostRateLimiter(rate=rate_limit, max_in_flight=max_in_flight)
+        self.max_retries = max_retries
+        self.posts_per_page = posts_per_page
+        self.parser = resolve_backend(parser)
+        # Post records extracted at crawl time, so structured_data.py does not have to parse the pages again
+        self.posts_file = os.path.join(output_dir, "posts.jsonl") if extract_posts else None
+        self.extraction_profile = extraction_profile
+        # Topic stats of the previous run, only set for incremental crawls
+        self.baseline = None
+        self.setup_logging(log_level)
+        self.metrics = CrawlMetrics()
+        self.headless = headless
+        # With 'eager', driver.get returns once the DOM is parsed; readiness is then decided per page type
+        self.page_load_strategy = page_load_strategy
+        self.readiness = ReadinessWaiter(timeout=ready_timeout, retries=ready_retries, conditions=ready_conditions,
+                                         metrics=self.metrics)
+        # The login browser; page fetches that need a browser use the driver pool
+        self.driver = None
+        self.driver_pool = DriverPool(self.create_driver, size=driver_pool_size, max_pages=driver_max_pages)
+        self.fetcher = create_fetcher(engine, self.driver_pool, self.base_url, self.readiness,
+                                      cookies_file=COOKIES_FILE)
+        self.storage = open_storage(storage, self.output_dir)
+        self.assets = AssetCache(self.output_dir, workers=asset_workers, cookies_file=COOKIES_FILE,
+                                 rate_limiter=self.rate_limiter, max_retries=max_retries)
         self.visited_urls_file = os.path.join(self.output_dir, "visited_urls.txt")
+        self.visited_urls_log = None
+        self.state_file = os.path.join(self.output_dir, "crawl_state.db")
+        self.metrics_file = os.path.join(self.output_dir, "crawl_metrics.json")
+
+    def url_key(self, url):
+        """Integer key of a URL in the compact URL index"""
+        return self.url_keys.intern(self.normalize_url(url), url)
+
+    def known_url_key(self, url):
+        """Integer key of a URL for membership tests, or None if the URL index never saw it"""
+        return self.url_keys.lookup(self.normalize_url(url))
+
+    def new_key_set(self, name):
+        """Integer key set of the URL index: in memory, or on disk behind a Bloom filter"""
+        if self.url_index == 'disk':
+            key_set = DiskIntSet(self.url_index_file, name, capacity=self.expected_urls)
+            self.disk_key_sets.append(key_set)
+            return key_set
+        return IntSet()
+
+    def close_url_index(self):
+        """Close the URL sets kept on disk; returns the number of disk lookups per set"""
+        disk_lookups = {key_set.name: key_set.disk_lookups for key_set in self.disk_key_sets}
+        for key_set in self.disk_key_sets:
+            key_set.close()
+        self.disk_key_sets = []
+        return disk_lookups
 
     def save_url_to_file(self, url):
-        """Save each visited URL to a file."""
-        with open(self.visited_urls_file, 'a') as f:
-            f.write(url + '\n')
+        """Save each visited URL to a file, through one buffered handle for the whole crawl."""
+        if self.visited_urls_log is None:
+            self.visited_urls_log = open(self.visited_urls_file, 'a', buffering=1024 * 1024)
+        self.visited_urls_log.write(url + '\n')
 
-    def setup_logging(self):
+    def setup_logging(self, level='INFO'):
         logging.basicConfig(
             filename='forum_mirror.log',
-            level=logging.DEBUG,  # Set to DEBUG level for detailed output
+            level=getattr(logging, level),  # DEBUG adds a line for every URL normalized and crawled
             format='%(asctime)s - %(levelname)s - %(message)s'
         )
 
-    def setup_driver(self):
+    def create_driver(self):
         chrome_options = Options()
-        # chrome_options.add_argument('--headless')  # Uncomment for headless mode
+        if self.headless:
+            chrome_options.add_argument('--headless=new')
+        chrome_options.page_load_strategy = self.page_load_strategy
         chrome_options.add_argument('--disable-gpu')
         chrome_options.add_argument('--no-sandbox')
         chrome_options.add_argument('--disable-dev-shm-usage')
         chrome_options.add_argument('--window-size=1920,1080')
-        self.driver = webdriver.Chrome(options=chrome_options)
+        return webdriver.Chrome(options=chrome_options)
+
+    def setup_driver(self):
+        self.driver = self.create_driver()
+
+    def get_driver(self):
+        """Return the WebDriver, starting Chrome on first use"""
+        if self.driver is None:
+            self.setup_driver()
+        return self.driver
+
+    def fetch_page(self, url):
+        """Fetch the HTML of a page with the configured fetch engine, within the host's rate limit"""
+        kind = page_type(url)
+        for attempt in range(self.max_retries + 1):
+            with self.metrics.timer('throttle', kind):
+                self.rate_limiter.acquire(url)
+            status = None
+            try:
+                with self.metrics.timer('fetch', kind):
+                    html_content = self.fetcher.fetch(url)
+                self.metrics.count('fetched_chars', kind, len(html_content))
+                return html_content
+            except Exception as e:
+                status = http_status(e)
+                if status not in THROTTLE_STATUSES or attempt == self.max_retries:
+                    raise
+                self.metrics.count('retries', kind)
+                logging.warning(f"Retrying {url} after HTTP {status} (attempt {attempt + 1})")
+            finally:
+                self.rate_limiter.release(url, status)
+
+    def add_if_new(self, collection, key):
+        """Add key to one of the shared crawl sets, returning False if it was already there"""
+        with self.lock:
+            if key in collection:
+                return False
+            collection.add(key)
+            return True
 
     def perform_login(self):
         if not self.login_config:
@@ -55,9 +178,8 @@ class ForumMirror:
             return False
 
         try:
-            self.driver.get(self.login_config['login_url'])
+            self.get_driver().get(self.login_config['login_url'])
             logging.info("Navigating to login page")
-            time.sleep(3)
 
             username_field = WebDriverWait(self.driver, 10).until(
                 EC.presence_of_element_located((By.CSS_SELECTOR, self.login_config['username_selector']))
@@ -70,11 +192,23 @@ class ForumMirror:
             login_button = self.driver.find_element(By.CSS_SELECTOR, self.login_config['login_button_selector'])
             login_button.click()
 
-            time.sleep(5)
+            try:
+                WebDriverWait(self.driver, self.readiness.timeout).until(
+                    lambda driver: self.login_config['username'] in driver.page_source
+                )
+            except TimeoutException:
+                pass  # Reported by check_login_success
 
             if self.check_login_success():
                 logging.info("Login successful")
-                pickle.dump(self.driver.get_cookies(), open('cookies.pkl', 'wb'))
+                cookies = self.driver.get_cookies()
+                with open(COOKIES_FILE, 'wb') as f:
+                    pickle.dump(cookies, f)
+                self.fetcher.load_cookies(cookies)
+                self.assets.load_cookies(cookies)
+                # Pages are rendered by the driver pool from here on, so free the login browser
+                self.driver.quit()
+                self.driver = None
                 return True
             else:
                 logging.error("Login failed")
@@ -132,10 +266,12 @@ class ForumMirror:
             # Keep only necessary parameters
             important_params = {}
             
-            # For forum sections, keep 'f'
+            # For forum sections, keep 'f' and 'start'
             if self.is_forum_section_link(url):
                 if 'f' in params:
                     important_params['f'] = params['f'][0]
+                if 'start' in params:
+                    important_params['start'] = params['start'][0]
             # For topics, keep 'f', 't', and 'start'
             elif self.is_topic_link(url):
                 if 'f' in params:
@@ -154,93 +290,82 @@ class ForumMirror:
                 query,
                 ''
             ))
-            logging.debug(f"Normalized URL: {normalized}")
+            if logging.root.isEnabledFor(logging.DEBUG):
+                logging.debug(f"Normalized URL: {normalized}")
             return normalized
         
         except Exception as e:
             logging.error(f"Error normalizing URL {url}: {str(e)}")
             return url
 
-    def download_assets(self, soup, base_folder):
-        """Download and update paths for images, CSS, and other assets"""
-        # Handle images
-        for img in soup.find_all('img'):
-            if img.get('src'):
-                try:
-                    img_url = urljoin(self.base_url, img['src'])
-                    img_path = os.path.join('assets', os.path.basename(img_url))
-                    full_img_path = os.path.join(base_folder, img_path)
-                    
-                    os.makedirs(os.path.dirname(full_img_path), exist_ok=True)
-                    
-                    response = requests.get(img_url)
-                    with open(full_img_path, 'wb') as f:
-                        f.write(response.content)
-                    
-                    img['src'] = f'../../{img_path}'
-                except Exception as e:
-                    logging.error(f"Failed to download image {img_url}: {str(e)}")
-
-        # Handle CSS
-        for css in soup.find_all('link', rel='stylesheet'):
-            if css.get('href'):
-                try:
-                    css_url = urljoin(self.base_url, css['href'])
-                    css_path = os.path.join('assets', os.path.basename(css_url))
-                    full_css_path = os.path.join(base_folder, css_path)
-                    
-                    os.makedirs(os.path.dirname(full_css_path), exist_ok=True)
-                    
-                    response = requests.get(css_url)
-                    with open(full_css_path, 'wb') as f:
-                        f.write(response.content)
-                    
-                    css['href'] = f'../../{css_path}'
-                except Exception as e:
-                    logging.error(f"Failed to download CSS {css_url}: {str(e)}")
+    def download_assets(self, page, page_file):
+        """Fetch images and CSS through the shared asset cache and point the page at the local copies"""
+        # Start every download first so the page's assets are fetched concurrently
+        pending = [(element, attr, self.assets.get(urljoin(self.base_url, element[attr])))
+                   for element, attr in page.assets]
+
+        page_dir = os.path.dirname(page_file)
+        for element, attr, future in pending:
+            asset_path = future.result()
+            if asset_path:
+                local_path = os.path.relpath(os.path.join(self.output_dir, asset_path), page_dir)
+                element[attr] = local_path.replace(os.sep, '/')
+
+    def parse(self, html_content, url, topic_id=None):
+        """Parse a fetched page once, extracting posts too when crawl-time extraction is enabled"""
+        with self.metrics.timer('parse', page_type(url)):
+            return parse_page(html_content, url, backend=self.parser,
+                              topic_id=topic_id if self.posts_file else None, profile=self.extraction_profile)
+
+    def save_page(self, page, url):
+        """Download the page's assets, then write the page with its links pointing at the local copies"""
+        kind = page_type(url)
+        path = self.page_path(url)
+        with self.metrics.timer('assets', kind):
+            self.download_assets(page, os.path.join(self.output_dir, path))
+        with self.metrics.timer('write', kind):
+            data = str(page.soup).encode('utf-8')
+            self.storage.write(path, url, data)
+            self.save_posts(page.posts)
+        self.metrics.count('bytes_written', kind, len(data))
+
+    def save_posts(self, posts):
+        """Append post records to the crawl's JSON Lines file"""
+        if not posts:
+            return
+        lines = ''.join(json.dumps(post, ensure_ascii=False) + '\n' for post in posts)
+        with self.lock:
+            with open(self.posts_file, 'a', encoding='utf-8') as f:
+                f.write(lines)
 
     def mirror_page(self, url):
-        if url in self.visited_urls:
+        if not self.add_if_new(self.visited_urls, url):
             return []
 
-        self.visited_urls.add(url)
-        self.save_url_to_file(url)
+        with self.lock:
+            self.save_url_to_file(url)
         logging.info(f"Mirroring page: {url}")
 
         try:
-            self.driver.get(url)
-            WebDriverWait(self.driver, 10).until(
-                EC.presence_of_element_located((By.TAG_NAME, "body"))
-            )
-            time.sleep(2)
-            
-            html_content = self.driver.page_source
-            soup = BeautifulSoup(html_content, 'html.parser')
-            
-            output_file = self.create_directory_structure(url)
-            self.download_assets(soup, self.output_dir)
-            # Save the HTML
-            with open(output_file, 'w', encoding='utf-8') as f:
-                f.write(str(soup))
-            
+            html_content = self.fetch_page(url)
+            page = self.parse(html_content, url)
+
+            self.save_page(page, url)
+
             # Find forum section links
             new_urls = []
-            for a in soup.find_all('a', href=True):
-                href = a['href']
-                if href.startswith('./'):
-                    href = href[2:]
-                full_url = urljoin(url, href)
+            for full_url in page.links:
                 if self.is_forum_section_link(full_url):
                     section_num = self.get_section_number(full_url)
-                    if section_num and section_num not in self.forum_sections:
-                        self.forum_sections.add(section_num)
+                    if section_num and self.add_if_new(self.forum_sections, section_num):
                         new_urls.append(full_url)
             
             return new_urls
 
         except Exception as e:
+            self.metrics.count('errors', 'page')
             logging.error(f"Failed to mirror {url}: {str(e)}")
-            return []
+            return None
 
     def get_topic_number(self, url):
         """Extract topic number from URL"""
@@ -248,40 +373,54 @@ class ForumMirror:
         params = parse_qs(parsed.query)
         return params.get('t', [None])[0]
 
-    def create_directory_structure(self, url):
-        """Create appropriate directory structure for saving files"""
+    def page_path(self, url):
+        """Path of the saved page relative to output_dir, mirroring the forum's structure"""
+        return page_path(url)
+
+    def get_pagination_urls(self, page, current_url):
+        """
+        Normalized URLs of the other pages of a topic or section. On the first page every
+        page is computed from the counts shown, so they can all be fetched in parallel;
+        the visible pagination links are included as well.
+        """
+        urls = {self.normalize_url(full_url) for full_url in page.pagination}
+        if self.get_start(current_url) == 0:
+            urls.update(self.paginated_url(current_url, start) for start in pagination_starts(page))
+        return list(urls)
+
+    def get_start(self, url):
+        """Extract the pagination offset from URL"""
+        params = parse_qs(urlparse(url).query)
+        return int(params.get('start', ['0'])[0] or 0)
+
+    def paginated_url(self, url, start):
+        """Build the URL of the topic or section page beginning at offset start"""
         parsed = urlparse(url)
         params = parse_qs(parsed.query)
-        
-        if parsed.path.endswith('viewforum.php') and 'f' in params:
-            section_num = params['f'][0]
-            path = f'forum/section_{section_num}/index.html'
-        elif parsed.path.endswith('viewtopic.php') and 't' in params:
-            topic_num = params['t'][0]
-            section_num = params.get('f', ['unknown'])[0]
-            start_param = params.get('start', ['0'])[0]
-            path = f'forum/section_{section_num}/topic_{topic_num}/page_{start_param}.html'
-        else:
-            path = parsed.path.lstrip('/')
-            if not path:
-                path = 'index.html'
-            elif not path.endswith('.html'):
-                path = os.path.join(path, 'index.html')
-
-        full_path = os.path.join(self.output_dir, path)
-        os.makedirs(os.path.dirname(full_path), exist_ok=True)
-        return full_path
-
-    def get_pagination_urls(self, soup, current_url):
-        pagination_urls = set()
-        
-        for link in soup.find('ul', class_='pagination').find_all('a'):
-            href = link.get('href')
-            if href:
-                full_url = urljoin(current_url, href)
-                pagination_urls.add(self.normalize_url(full_url))
-                
-        return list(pagination_urls)
+        query = {key: params[key][0] for key in ('f', 't') if key in params}
+        if start:
+            query['start'] = start
+        page_url = urlunparse((parsed.scheme, parsed.netloc, parsed.path, '',
+                               '&'.join(f"{k}={v}" for k, v in sorted(query.items())), ''))
+        return self.normalize_url(page_url)
+
+    def topic_urls_to_fetch(self, topic_url, topic_num, current_stats):
+        """
+        Pages of a newly discovered topic to queue. A full crawl starts at the first
+        page; an incremental crawl skips unchanged topics and only refetches the
+        pages of changed ones that can hold new replies.
+        """
+        if self.baseline is None or current_stats is None or topic_num not in self.baseline:
+            return [topic_url]
+        previous_stats = self.baseline[topic_num]
+        if previous_stats == current_stats:
+            return []
+        old_replies, new_replies = previous_stats[0], current_stats[0]
+        if old_replies is None or new_replies is None:
+            return [topic_url]
+        starts = trailing_page_starts(old_replies, new_replies, self.posts_per_page)
+        logging.info(f"Topic {topic_num} changed, refetching {len(starts)} trailing page(s)")
+        return [self.paginated_url(topic_url, start) for start in starts]
 
     def mirror_topic(self, topic_url):
         """Mirror an entire topic including all its pages"""
@@ -292,31 +431,27 @@ class ForumMirror:
         new_urls = []
 
         try:
-            self.driver.get(topic_url)
-            WebDriverWait(self.driver, 10).until(
-                EC.presence_of_element_located((By.TAG_NAME, "body"))
-            )
-            time.sleep(2)
-            
-            html_content = self.driver.page_source
-            soup = BeautifulSoup(html_content, 'html.parser')
-            
-            output_file = self.create_directory_structure(topic_url)
-            self.download_assets(soup, self.output_dir)
-            
-            with open(output_file, 'w', encoding='utf-8') as f:
-                f.write(str(soup))
+            html_content = self.fetch_page(topic_url)
+            page = self.parse(html_content, topic_url, topic_id=self.get_topic_number(topic_url))
+
+            self.save_page(page, topic_url)
             
-            self.visited_urls.add(topic_url)
+            with self.lock:
+                self.visited_urls.add(topic_url)
             
-            pagination_urls = self.get_pagination_urls(soup, topic_url)
+            pagination_urls = self.get_pagination_urls(page, topic_url)
+            if self.baseline is not None:
+                # Earlier pages are unchanged since the previous run, only follow later ones
+                current_start = self.get_start(topic_url)
+                pagination_urls = [u for u in pagination_urls if self.get_start(u) > current_start]
             new_urls.extend(pagination_urls)
             
             return new_urls
 
         except Exception as e:
+            self.metrics.count('errors', 'topic')
             logging.error(f"Failed to mirror topic {topic_url}: {str(e)}")
-            return []
+            return None
 
     def mirror_section(self, section_url):
         """Mirror an entire forum section including all topics"""
@@ -327,80 +462,218 @@ class ForumMirror:
         new_urls = []
 
         try:
-            self.driver.get(section_url)
-            WebDriverWait(self.driver, 10).until(
-                EC.presence_of_element_located((By.TAG_NAME, "body"))
-            )
-            time.sleep(2)
-            
-            html_content = self.driver.page_source
-            soup = BeautifulSoup(html_content, 'html.parser')
-            
+            html_content = self.fetch_page(section_url)
+            page = self.parse(html_content, section_url)
+
             # Save the current page
-            output_file = self.create_directory_structure(section_url)
-            self.download_assets(soup, self.output_dir)
-            
-            with open(output_file, 'w', encoding='utf-8') as f:
-                f.write(str(soup))
+            self.save_page(page, section_url)
             
-            self.visited_urls.add(section_url)
+            with self.lock:
+                self.visited_urls.add(section_url)
             
+            topic_stats = parse_topic_stats(page.soup) if self.baseline is not None else {}
+
             # Find all topic links
-            for a in soup.find_all('a', href=True):
-                href = a['href']
-                if href.startswith('./'):
-                    href = href[2:]
-                full_url = urljoin(section_url, href)
-                
+            for full_url in page.links:
                 if self.is_topic_link(full_url):
                     topic_num = self.get_topic_number(full_url)
-                    if topic_num and topic_num not in self.topics:
-                        self.topics.add(topic_num)
-                        new_urls.append(full_url)
+                    if topic_num and self.add_if_new(self.topics, topic_num):
+                        new_urls.extend(self.topic_urls_to_fetch(full_url, topic_num, topic_stats.get(topic_num)))
             
             # Get pagination URLs for the section
-            pagination_urls = self.get_pagination_urls(soup, section_url)
+            pagination_urls = self.get_pagination_urls(page, section_url)
             new_urls.extend(pagination_urls)
             
             return new_urls
 
         except Exception as e:
+            self.metrics.count('errors', 'section')
             logging.error(f"Failed to mirror section {section_url}: {str(e)}")
-            return []
-
-    def mirror_forum(self, max_sections=None):
+            return None
+
+    def url_priority(self, url):
+        """Frontier priority class: sections before topics, first pages before deeper pagination"""
+        params = parse_qs(urlparse(url).query)
+        deep = int(params.get('start', ['0'])[0] or 0) > 0
+        if self.is_forum_section_link(url):
+            return 1 + deep
+        if self.is_topic_link(url):
+            return 3 + deep
+        return 0
+
+    def url_shard(self, url, shards, partition='section'):
+        """
+        Shard of a sharded crawl that mirrors the URL (see sharding.py).
+        :param partition: 'section' keeps every page of a section in one shard; 'topic' spreads topics by hash
+        """
+        topic_num = self.get_topic_number(url) if partition == 'topic' and self.is_topic_link(url) else None
+        if topic_num:
+            return zlib.crc32(topic_num.encode('utf-8')) % shards
+        section_num = self.get_section_number(url)
+        if section_num and section_num.isdigit():
+            return int(section_num) % shards
+        return 0
+
+    def process_url(self, url):
+        """Mirror one URL from the frontier and return the new URLs it leads to, or None if it failed"""
+        if self.is_forum_section_link(url):
+            section_num = self.get_section_number(url)
+            with self.lock:
+                if section_num not in self.sections_mirrored:
+                    if self.max_sections and len(self.sections_mirrored) >= self.max_sections:
+                        return []
+                    self.sections_mirrored.add(section_num)
+            new_urls = self.mirror_section(url)
+        elif self.is_topic_link(url):
+            new_urls = self.mirror_topic(url)
+        else:
+            new_urls = self.mirror_page(url)
+        if new_urls is None:
+            return None
+
+        self.metrics.count('pages', page_type(url))
+        if logging.root.isEnabledFor(logging.DEBUG):
+            logging.debug(f"Queue size: {len(self.scheduler.queue)}, Visited: {len(self.visited_urls)}")
+        return new_urls
+
+    def restore_state(self, frontier):
+        """Continue the crawl recorded in the state file instead of starting from the root"""
+        frontier.restore(self.visited_urls, self.rediscover)
+        if not len(frontier) and self.visited_urls:
+            logging.info("Previous crawl already completed; run with --restart to mirror again")
+
+    def rediscover(self, url):
+        """
+        Record the section or topic of a journaled URL as discovered again. Only URLs
+        in the journal count, so a topic whose pages were never queued is found again.
+        """
+        if self.is_topic_link(url):
+            topic_num = self.get_topic_number(url)
+            if topic_num:
+                self.topics.add(topic_num)
+        elif self.is_forum_section_link(url):
+            section_num = self.get_section_number(url)
+            if section_num:
+                self.forum_sections.add(section_num)
+
+    def mirror_forum(self, max_sections=None, workers=4, resume=True, incremental=False,
+                     progress_interval=10, prometheus_file=None, frontier=None):
+        """
+        Mirror the whole forum starting from base_url.
+        :param max_sections: Only mirror the first this many forum sections
+        :param workers: Number of pages fetched concurrently; 1 crawls serially
+        :param resume: Continue from the crawl state saved by a previous run
+        :param incremental: Refresh an existing mirror, only refetching changed topics
+        :param progress_interval: Seconds between progress lines; 0 disables them
+        :param prometheus_file: Also export the metrics in Prometheus text format to this file
+        :param frontier: Frontier shared with other crawlers (see sharding.py) instead of this mirror's own state
+        """
+        self.state = CrawlState(self.state_file)
         try:
             if self.login_config and not self.perform_login():
                 logging.error("Failed to login. Aborting mirror process.")
                 return
 
-            urls_to_visit = [self.base_url]
-            sections_processed = 0
-
-            while urls_to_visit:
-                url = urls_to_visit.pop(0)
-                
-                if self.is_forum_section_link(url):
-                    if max_sections and sections_processed >= max_sections:
-                        break
-                    new_urls = self.mirror_section(url)
-                    sections_processed += 1
-                elif self.is_topic_link(url):
-                    new_urls = self.mirror_topic(url)
+            self.max_sections = max_sections
+            self.sections_mirrored = set()
+            if frontier is None:
+                # Each canonical URL enters the frontier once, so it doubles as the visited check
+                frontier = JournaledFrontier(self.state, key=self.normalize_url,
+                                             priority=self.url_priority, priorities=5, interner=self.url_keys,
+                                             seen=self.new_key_set('seen') if self.url_keys else None)
+                if incremental:
+                    # Compare against the section pages saved by the previous run
+                    self.baseline = load_topic_baseline(self.storage)
+                    self.assets.refresh = True
+                    self.state.reset()
+                elif resume:
+                    self.restore_state(frontier)
                 else:
-                    new_urls = self.mirror_page(url)
-                
-                # Ensure new URLs are not already visited
-                urls_to_visit.extend([u for u in new_urls if u not in self.visited_urls])
-                logging.info(f"Queue size: {len(urls_to_visit)}, Visited: {len(self.visited_urls)}")
+                    self.state.reset()
+            self.scheduler = CrawlScheduler(self.process_url, workers=workers, frontier=frontier)
+            if progress_interval:
+                self.metrics.start_reporting(progress_interval, lambda: len(frontier), prometheus_file)
+            self.scheduler.run([self.base_url])
+            # Other crawlers sharing the frontier can still queue URLs for this one
+            while frontier.more_expected():
+                self.scheduler.run([])
 
         except Exception as e:
             logging.error(f"Mirror process failed: {str(e)}")
         finally:
-            self.driver.quit()
+            self.metrics.stop_reporting()
+            self.assets.close()
+            logging.info(self.assets.report())
+            print(self.assets.report())
+            self.state.close()
+            self.storage.close()
+            if self.visited_urls_log is not None:
+                self.visited_urls_log.close()
+                self.visited_urls_log = None
+            self.fetcher.close()
+            logging.info(self.readiness.report())
+            logging.info(f"Driver pool recycled {self.driver_pool.recycled} browsers")
+            if self.driver is not None:
+                self.driver.quit()
+            disk_lookups = self.close_url_index()
+            if disk_lookups:
+                logging.info(f"URL index disk lookups: {disk_lookups}")
+            self.metrics.write_summary(self.metrics_file, {
+                'assets': dict(self.assets.stats),
+                'browser_fallbacks': getattr(self.fetcher, 'fallback_count', 0),
+                'browsers_recycled': self.driver_pool.recycled,
+                'disk_lookups': disk_lookups,
+            })
+            if prometheus_file:
+                self.metrics.write_prometheus(prometheus_file)
             logging.info(f"Mirroring complete. Processed {len(self.forum_sections)} sections and {len(self.topics)} topics")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mirror a phpBB forum")
+    parser.add_argument('--engine', choices=FETCH_ENGINES, default='http',
+                        help="'http' fetches over a pooled session and falls back to Selenium "
+                             "for pages that need JavaScript; 'selenium' renders every page")
+    parser.add_argument('--workers', type=int, default=4, help="Pages fetched concurrently")
+    parser.add_argument('--rate', type=float, default=2.0, help="Maximum requests per second per host")
+    parser.add_argument('--max-in-flight', type=int, default=4, help="Maximum concurrent requests per host")
+    parser.add_argument('--restart', action='store_true',
+                        help="Ignore the saved crawl state and mirror from the root again")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Refresh the existing mirror, only fetching topics that changed since the last run")
+    parser.add_argument('--posts-per-page', type=int, default=10, help="Posts per topic page on the forum")
+    parser.add_argument('--parser', choices=PARSER_BACKENDS, default='html.parser',
+                        help="HTML parser backend; lxml is much faster when installed")
+    parser.add_argument('--extract-posts', action='store_true',
+                        help="Write post records to posts.jsonl while crawling")
+    parser.add_argument('--extraction-profile',
+                        help="Theme profile or JSON file for --extract-posts (see extraction_profiles.py)")
+    parser.add_argument('--driver-pool-size', type=int, default=2,
+                        help="Browsers rendering JavaScript pages concurrently")
+    parser.add_argument('--driver-max-pages', type=int, default=200,
+                        help="Restart a browser after this many pages to bound its memory use")
+    parser.add_argument('--show-browser', action='store_true', help="Run Chrome with a visible window")
+    parser.add_argument('--page-load-strategy', choices=PAGE_LOAD_STRATEGIES, default='eager',
+                        help="When Chrome hands a page back; readiness is then checked per page type")
+    parser.add_argument('--ready-timeout', type=float, default=10,
+                        help="Seconds to wait for a browser page to become ready")
+    parser.add_argument('--ready-retries', type=int, default=1, help="Reloads of a page that did not become ready")
+    parser.add_argument('--progress-interval', type=float, default=10,
+                        help="Seconds between progress lines (0 to disable)")
+    parser.add_argument('--prometheus-file', help="Export crawl metrics in Prometheus text format to this file")
+    parser.add_argument('--storage', choices=STORAGE_BACKENDS, default='directory',
+                        help="'directory' saves one file per page; 'warc' appends pages to compressed "
+                             "WARC segments in mirrored_forum/archive")
+    parser.add_argument('--log-level', choices=('DEBUG', 'INFO', 'WARNING', 'ERROR'), default='INFO')
+    parser.add_argument('--url-index', choices=URL_INDEXES, default='compact',
+                        help="'compact' keeps crawled URLs as packed integers in arrays; 'disk' keeps them in "
+                             "SQLite behind a Bloom filter for boards too large for memory; 'python' uses sets "
+                             "of strings")
+    parser.add_argument('--rewrite-links', action='store_true',
+                        help="Afterwards point the links of the saved pages at the local copies (see link_rewriter.py)")
+    parser.add_argument('--expected-urls', type=int, default=1000000,
+                        help="URLs the Bloom filters of --url-index disk are sized for")
+    args = parser.parse_args()
+
     # Load login configuration
     with open('login_config.json', 'r') as f:
         login_config = json.load(f)
@@ -408,5 +681,18 @@ if __name__ == "__main__":
     base_url = login_config['base_url'] 
     output_directory = "mirrored_forum"
     
-    mirror = ForumMirror(base_url, output_directory, login_config=login_config)
-    mirror.mirror_forum(max_sections=None)
+    mirror = ForumMirror(base_url, output_directory, login_config=login_config, engine=args.engine,
+                         rate_limit=args.rate, max_in_flight=args.max_in_flight,
+                         posts_per_page=args.posts_per_page,
+                         parser=args.parser,
+                         extract_posts=args.extract_posts, driver_pool_size=args.driver_pool_size,
+                         driver_max_pages=args.driver_max_pages, headless=not args.show_browser,
+                         page_load_strategy=args.page_load_strategy, ready_timeout=args.ready_timeout,
+                         ready_retries=args.ready_retries, ready_conditions=login_config.get('ready_conditions'),
+                         log_level=args.log_level, storage=args.storage, url_index=args.url_index,
+                         expected_urls=args.expected_urls, extraction_profile=args.extraction_profile)
+    mirror.mirror_forum(max_sections=None, workers=args.workers, resume=not args.restart,
+                        incremental=args.incremental, progress_interval=args.progress_interval,
+                        prometheus_file=args.prometheus_file)
+    if args.rewrite_links:
+        rewrite_mirror_links(output_directory, base_url, args.storage)
@@ -0,0 +1,112 @@
+from urllib.parse import urljoin, urlparse, parse_qs
+from bs4 import BeautifulSoup
+from structured_data import extract_posts
+
+import re
+import logging
+
+# BeautifulSoup tree builders; lxml is several times faster than the pure Python parser
+PARSER_BACKENDS = ('html.parser', 'lxml')
+
+# The item count in front of the pagination, e.g. "1,234 posts • Page 1 of 124"
+COUNT_RE = re.compile(r'\d[\d.,]*')
+
+
+class PageData:
+    """Everything the crawler needs from one page, collected in a single pass over the document."""
+
+    def __init__(self, soup):
+        self.soup = soup
+        self.links = []
+        self.pagination = []
+        self.pagination_text = None
+        self.assets = []
+        self.articles = []
+        self.posts = []
+
+
+def resolve_backend(backend):
+    """Fall back to the bundled parser when the requested backend is not installed"""
+    if backend == 'lxml':
+        try:
+            import lxml  # noqa: F401
+        except ImportError:
+            logging.warning("lxml is not installed, falling back to html.parser")
+            return 'html.parser'
+    return backend
+
+
+def parse_page(html_content, page_url, backend='html.parser', topic_id=None, profile=None):
+    """
+    Parse a page once and collect its links, pagination links, assets and posts.
+    :param html_content: HTML of the page
+    :param page_url: URL the page was fetched from, to resolve relative links
+    :param backend: BeautifulSoup tree builder, one of PARSER_BACKENDS
+    :param topic_id: Topic number of a topic page; when given, its posts are extracted
+    :param profile: Theme profile for the post extraction (see extraction_profiles.py)
+    :return: PageData
+    """
+    soup = BeautifulSoup(html_content, backend)
+    page = PageData(soup)
+    pagination_anchors = set()
+
+    for element in soup.find_all(True):
+        name = element.name
+        if name == 'a':
+            href = element.get('href')
+            if href:
+                full_url = urljoin(page_url, href)
+                page.links.append(full_url)
+                if id(element) in pagination_anchors:
+                    page.pagination.append(full_url)
+        elif name == 'img':
+            if element.get('src'):
+                page.assets.append((element, 'src'))
+        elif name == 'link':
+            if element.get('href') and 'stylesheet' in element.get('rel', []):
+                page.assets.append((element, 'href'))
+        elif name == 'ul':
+            # Pagination anchors come after their <ul> in document order
+            if 'pagination' in element.get('class', []):
+                pagination_anchors.update(id(a) for a in element.find_all('a'))
+        elif name == 'div':
+            if page.pagination_text is None and 'pagination' in element.get('class', []):
+                page.pagination_text = element.get_text(' ', strip=True)
+        elif name == 'article':
+            if element.get('role') == 'article':
+                page.articles.append(element)
+
+    if topic_id is not None:
+        try:
+            # The <article> elements collected above are the posts of the bootstrap theme, used when the profile agrees
+            page.posts = extract_posts(soup, topic_id, page.articles or None, profile)
+        except Exception as e:
+            logging.error(f"Failed to extract posts from {page_url}: {str(e)}")
+    return page
+
+
+def pagination_starts(page):
+    """
+    Every start= offset of a paginated topic or section, computed from its first page:
+    the page size is the smallest offset linked, and the last offset follows from the
+    item count shown with the pagination or the last page link. Pages beyond the
+    visible window of page links are found without visiting the pages in between.
+    A page without links to other pages is the only one; its item count is not used,
+    as the page size cannot be told from it.
+    :param page: PageData of the first page
+    :return: Offsets of the pages after the first one
+    """
+    starts = []
+    for url in page.pagination:
+        start = parse_qs(urlparse(url).query).get('start', ['0'])[0]
+        if start.isdigit():
+            starts.append(int(start))
+    per_page = min((start for start in starts if start > 0), default=None)
+    if per_page is None:
+        return []
+    last_start = max(starts)
+    match = COUNT_RE.search(page.pagination_text or '')
+    if match:
+        total = int(match.group().replace(',', '').replace('.', '') or 0)
+        last_start = max(last_start, (total - 1) // per_page * per_page)
+    return list(range(per_page, last_start + 1, per_page))
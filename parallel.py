@@ -0,0 +1,46 @@
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, as_completed, wait
+
+import os
+
+
+def batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def map_batches(function, items, args=(), workers=None, batch_size=32, initializer=None, initargs=()):
+    """
+    Call function(batch, *args) for batches of items over a process pool. At most a
+    few batches per worker are in flight, so memory stays bounded however many items
+    there are.
+    :param items: Iterable of work items, consumed lazily
+    :param workers: Number of worker processes (default: one per CPU); 1 runs in this process
+    :param batch_size: Items per task
+    :param initializer: Called with initargs once in every worker (in this process when workers is 1)
+    :return: Generator of the results per batch, in completion order
+    """
+    workers = workers or os.cpu_count() or 1
+    batches = batched(items, batch_size)
+    if workers == 1:
+        if initializer is not None:
+            initializer(*initargs)
+        for batch in batches:
+            yield function(batch, *args)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=initializer, initargs=initargs) as executor:
+        pending = set()
+        for batch in batches:
+            pending.add(executor.submit(function, batch, *args))
+            if len(pending) >= workers * 4:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        for future in as_completed(pending):
+            yield future.result()
@@ -0,0 +1,106 @@
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.support.ui import WebDriverWait
+from urllib.parse import urlparse
+
+import time
+import logging
+import threading
+
+# CSS selectors that must all match before a rendered page is considered ready;
+# a comma separated group matches if any of its selectors does
+READY_CONDITIONS = {
+    'topic': ('div.pagination', 'article[role="article"], div.postbody'),
+    'section': ('div.pagination', 'ul.topiclist, a.topictitle'),
+    'index': ('ul.topiclist, a.forumtitle',),
+    'page': ('body',),
+}
+
+PAGE_LOAD_STRATEGIES = ('normal', 'eager', 'none')
+
+# One round trip per poll: the DOM is parsed and every required selector matches
+READY_SCRIPT = (
+    "return document.readyState !== 'loading' && "
+    "arguments[0].every(function (s) { return document.querySelector(s) !== null; });"
+)
+
+
+def page_type(url):
+    """Classify a forum URL as 'topic', 'section', 'index' or 'page'"""
+    path = urlparse(url).path
+    if path.endswith('viewtopic.php'):
+        return 'topic'
+    if path.endswith('viewforum.php'):
+        return 'section'
+    if path.endswith('index.php') or path.endswith('/'):
+        return 'index'
+    return 'page'
+
+
+class ReadinessWaiter:
+    """
+    Waits until a rendered page shows the elements its page type needs, instead
+    of sleeping a fixed time, and records the time to ready per page type.
+    """
+
+    def __init__(self, timeout=10, retries=1, poll_interval=0.1, conditions=None, metrics=None):
+        self.timeout = timeout
+        self.retries = retries
+        self.poll_interval = poll_interval
+        self.conditions = dict(READY_CONDITIONS)
+        self.conditions.update(conditions or {})
+        self.metrics = metrics
+        self.lock = threading.Lock()
+        self.stats = {}
+
+    def wait(self, driver, url, started=None):
+        """
+        Wait for the page the driver is loading to be ready.
+        :param started: perf_counter() value when navigation started, so the load itself is timed too
+        :return: True when ready, False on timeout
+        """
+        kind = page_type(url)
+        selectors = list(self.conditions.get(kind, READY_CONDITIONS['page']))
+        started = started if started is not None else time.perf_counter()
+        try:
+            WebDriverWait(driver, self.timeout, poll_frequency=self.poll_interval).until(
+                lambda d: d.execute_script(READY_SCRIPT, selectors)
+            )
+            ready = True
+        except TimeoutException:
+            ready = False
+        self.record(kind, time.perf_counter() - started, ready)
+        return ready
+
+    def load(self, driver, url):
+        """Navigate to url and wait for it to be ready, reloading on timeout up to `retries` times"""
+        for attempt in range(self.retries + 1):
+            started = time.perf_counter()
+            driver.get(url)
+            if self.wait(driver, url, started):
+                return True
+            logging.warning(f"{url} not ready after {self.timeout}s (attempt {attempt + 1})")
+        return False
+
+    def record(self, kind, elapsed, ready):
+        if self.metrics is not None:
+            if ready:
+                self.metrics.record('wait', kind, elapsed)
+            else:
+                self.metrics.count('wait_timeouts', kind)
+        with self.lock:
+            stats = self.stats.setdefault(kind, {'pages': 0, 'total': 0.0, 'max': 0.0, 'timeouts': 0})
+            if ready:
+                stats['pages'] += 1
+                stats['total'] += elapsed
+                stats['max'] = max(stats['max'], elapsed)
+            else:
+                stats['timeouts'] += 1
+
+    def report(self):
+        with self.lock:
+            parts = [
+                f"{kind} {stats['pages']} pages, avg {stats['total'] / stats['pages'] if stats['pages'] else 0:.2f}s, "
+                f"max {stats['max']:.2f}s, {stats['timeouts']} timeouts"
+                for kind, stats in sorted(self.stats.items())
+            ]
+        return "Time to ready: " + ("; ".join(parts) if parts else "no browser pages")
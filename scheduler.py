@@ -0,0 +1,143 @@
+from urllib.parse import urlparse
+from frontier import Frontier
+
+import threading
+import logging
+import time
+
+# HTTP statuses that mean the server wants us to slow down
+THROTTLE_STATUSES = (429, 503)
+
+
+class HostState:
+    """Token bucket, in-flight count and backoff state of one host."""
+
+    def __init__(self, rate, burst):
+        self.base_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.in_flight = 0
+        self.backoff_delay = 0
+        self.paused_until = 0
+
+    def reserve(self):
+        """Take a token if one is available, otherwise return how long to wait for one"""
+        now = time.monotonic()
+        if now < self.paused_until:
+            return self.paused_until - now
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+class HostRateLimiter:
+    """
+    Per-host politeness: a token bucket limiting requests per second, a cap on
+    requests in flight, and adaptive backoff when the host answers 429/503.
+    """
+
+    def __init__(self, rate=2.0, burst=2, max_in_flight=4, max_backoff=60.0):
+        self.rate = rate
+        self.burst = burst
+        self.max_in_flight = max_in_flight
+        self.max_backoff = max_backoff
+        self.hosts = {}
+        self.condition = threading.Condition()
+
+    def host_state(self, url):
+        host = urlparse(url).netloc.lower()
+        if host not in self.hosts:
+            self.hosts[host] = HostState(self.rate, self.burst)
+        return self.hosts[host]
+
+    def acquire(self, url):
+        """Block until a request to the URL's host is allowed"""
+        with self.condition:
+            state = self.host_state(url)
+            while state.in_flight >= self.max_in_flight:
+                self.condition.wait()
+            state.in_flight += 1
+
+        while True:
+            with self.condition:
+                delay = state.reserve()
+            if delay <= 0:
+                return
+            time.sleep(delay)
+
+    def release(self, url, status=None):
+        """Free the in-flight slot and adapt the host's rate to the response status"""
+        with self.condition:
+            state = self.host_state(url)
+            state.in_flight -= 1
+            if status in THROTTLE_STATUSES:
+                state.backoff_delay = min(self.max_backoff, max(1.0, state.backoff_delay * 2))
+                state.paused_until = time.monotonic() + state.backoff_delay
+                state.rate = max(state.base_rate / 16, state.rate / 2)
+                logging.warning(f"Host {urlparse(url).netloc} throttled us ({status}), "
+                                f"backing off {state.backoff_delay:.1f}s at {state.rate:.2f} req/s")
+            else:
+                state.backoff_delay = 0
+                state.rate = min(state.base_rate, state.rate * 1.1)
+            self.condition.notify_all()
+
+
+class CrawlScheduler:
+    """
+    Run process_url over a shared frontier with a bounded pool of worker threads.
+    process_url returns the new URLs a URL leads to, or None when the URL failed.
+    """
+
+    def __init__(self, process_url, workers=4, frontier=None):
+        self.process_url = process_url
+        self.workers = workers
+        self.condition = threading.Condition()
+        self.queue = frontier if frontier is not None else Frontier()
+        self.in_flight = 0
+
+    def run(self, seed_urls):
+        self.queue.extend(seed_urls)
+        threads = [threading.Thread(target=self.worker, name=f"crawl-worker-{i}")
+                   for i in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def next_url(self):
+        with self.condition:
+            while True:
+                url = self.queue.pop()
+                if url is not None:
+                    self.in_flight += 1
+                    return url
+                if not self.in_flight:
+                    # Nothing queued and nothing running that could queue more
+                    self.condition.notify_all()
+                    return None
+                self.condition.wait()
+
+    def worker(self):
+        while True:
+            url = self.next_url()
+            if url is None:
+                return
+            new_urls = None
+            try:
+                new_urls = self.process_url(url)
+            except Exception as e:
+                logging.error(f"Worker failed on {url}: {str(e)}")
+            finally:
+                with self.condition:
+                    self.in_flight -= 1
+                    if new_urls is None:
+                        self.queue.failed(url)
+                    else:
+                        self.queue.extend(new_urls)
+                        self.queue.done(url)
+                    self.condition.notify_all()
@@ -0,0 +1,163 @@
+import os
+import re
+import time
+import sqlite3
+import argparse
+
+SECTION_RE = re.compile(r'section_(\d+)')
+# "Thứ 4 Tháng 3 02, 2024 2:37 pm" (Vietnamese) or "Mon Mar 04, 2024 10:15 am" (English)
+VIETNAMESE_TIME_RE = re.compile(r'Tháng (\d{1,2}) (\d{1,2}), (\d{4}) (\d{1,2}):(\d{2}) ?(am|pm)?', re.IGNORECASE)
+ENGLISH_TIME_RE = re.compile(r'([A-Z][a-z]{2}) (\d{1,2}), (\d{4}) (\d{1,2}):(\d{2}) ?(am|pm)?', re.IGNORECASE)
+MONTHS = ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec']
+
+
+def parse_post_time(timestamp):
+    """
+    Converts a phpBB post timestamp to a sortable 'YYYY-MM-DD HH:MM' string.
+    :param timestamp: Timestamp text as shown on the topic page
+    :return: The normalized time, or None if the format is not recognised
+    """
+    if not timestamp:
+        return None
+    match = VIETNAMESE_TIME_RE.search(timestamp)
+    if match:
+        month, day, year, hour, minute, meridiem = match.groups()
+        month = int(month)
+    else:
+        match = ENGLISH_TIME_RE.search(timestamp)
+        if not match or match.group(1).lower() not in MONTHS:
+            return None
+        month_name, day, year, hour, minute, meridiem = match.groups()
+        month = MONTHS.index(month_name.lower()) + 1
+    hour = int(hour)
+    if meridiem:
+        hour = hour % 12 + (12 if meridiem.lower() == 'pm' else 0)
+    return f"{year}-{month:02d}-{int(day):02d} {hour:02d}:{minute}"
+
+
+class SearchIndex:
+    """
+    Full-text index of the extracted posts (SQLite FTS5). Posts are stored per
+    source file, so re-extracting a file replaces exactly its posts.
+    """
+
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS documents (
+                id INTEGER PRIMARY KEY,
+                path TEXT NOT NULL,
+                section TEXT,
+                topic_id TEXT,
+                topic_title TEXT,
+                post_id TEXT,
+                post_title TEXT,
+                author TEXT,
+                timestamp TEXT,
+                posted_at TEXT
+            );
+            CREATE INDEX IF NOT EXISTS documents_path ON documents (path);
+            CREATE INDEX IF NOT EXISTS documents_author ON documents (author);
+            CREATE INDEX IF NOT EXISTS documents_posted_at ON documents (posted_at);
+            CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5(
+                post_title, content, tokenize = 'unicode61 remove_diacritics 2'
+            );
+        """)
+
+    def is_empty(self):
+        return self.connection.execute('SELECT 1 FROM documents LIMIT 1').fetchone() is None
+
+    def remove(self, file_paths):
+        """Drops the posts of the given source files"""
+        with self.connection:
+            for file_path in file_paths:
+                self.delete_file(file_path)
+
+    def delete_file(self, file_path):
+        self.connection.execute(
+            'DELETE FROM posts_fts WHERE rowid IN (SELECT id FROM documents WHERE path = ?)', (file_path,))
+        self.connection.execute('DELETE FROM documents WHERE path = ?', (file_path,))
+
+    def replace(self, results):
+        """
+        Indexes freshly extracted files, replacing what was indexed for them before.
+        :param results: List of (path, posts)
+        """
+        with self.connection:
+            for file_path, posts in results:
+                self.delete_file(file_path)
+                match = SECTION_RE.search(file_path)
+                section = match.group(1) if match else None
+                for post in posts:
+                    cursor = self.connection.execute(
+                        'INSERT INTO documents (path, section, topic_id, topic_title, post_id, post_title, '
+                        'author, timestamp, posted_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                        (file_path, section, post['topic_id'], post['topic_title'], post['post_id'],
+                         post['post_title'], post['author'], post['timestamp'],
+                         parse_post_time(post['timestamp'])))
+                    self.connection.execute(
+                        'INSERT INTO posts_fts (rowid, post_title, content) VALUES (?, ?, ?)',
+                        (cursor.lastrowid, post['post_title'], post['content']))
+
+    def search(self, query, author=None, section=None, since=None, until=None, limit=20):
+        """
+        Ranked full-text search.
+        :param query: FTS5 query, e.g. 'engine oil' or '"exact phrase"'
+        :param author: Only posts by this author
+        :param section: Only posts in this section number
+        :param since: Only posts at or after this date ('YYYY-MM-DD')
+        :param until: Only posts on or before this date ('YYYY-MM-DD')
+        :param limit: Maximum number of hits
+        :return: List of hit dictionaries, best match first
+        """
+        conditions = ['posts_fts MATCH ?']
+        params = [query]
+        if author:
+            conditions.append('d.author = ?')
+            params.append(author)
+        if section:
+            conditions.append('d.section = ?')
+            params.append(str(section))
+        if since:
+            conditions.append('d.posted_at >= ?')
+            params.append(since)
+        if until:
+            conditions.append('d.posted_at < ?')
+            params.append(until + ' 99')  # Include the whole day
+        params.append(limit)
+        rows = self.connection.execute(
+            'SELECT d.path, d.section, d.topic_id, d.topic_title, d.post_id, d.author, d.timestamp, '
+            "snippet(posts_fts, 1, '[', ']', '...', 16), bm25(posts_fts) AS rank "
+            'FROM posts_fts JOIN documents d ON d.id = posts_fts.rowid '
+            f"WHERE {' AND '.join(conditions)} ORDER BY rank LIMIT ?", params)
+        columns = ['path', 'section', 'topic_id', 'topic_title', 'post_id', 'author', 'timestamp', 'snippet', 'rank']
+        return [dict(zip(columns, row)) for row in rows]
+
+    def close(self):
+        self.connection.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Search the posts of the offline mirror")
+    parser.add_argument('query', help="Words to search for (FTS5 syntax: \"phrase\", word*, a OR b)")
+    parser.add_argument('--index', default='search_index.db', help="Index built by structured_data.py --index")
+    parser.add_argument('--author')
+    parser.add_argument('--section')
+    parser.add_argument('--since', help="YYYY-MM-DD")
+    parser.add_argument('--until', help="YYYY-MM-DD")
+    parser.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.index):
+        raise SystemExit(f"No search index at {args.index}; build it with: python3 structured_data.py --index")
+
+    index = SearchIndex(args.index)
+    start = time.perf_counter()
+    hits = index.search(args.query, author=args.author, section=args.section,
+                        since=args.since, until=args.until, limit=args.limit)
+    elapsed = time.perf_counter() - start
+    for hit in hits:
+        print(f"{hit['path']}#{hit['post_id']}  {hit['author']}  {hit['timestamp']}")
+        print(f"    {hit['topic_title']}: {hit['snippet']}")
+    print(f"{len(hits)} hits in {elapsed * 1000:.1f} ms")
+    index.close()
@@ -0,0 +1,443 @@
+from multiprocessing import Process
+from collections import deque
+from mirror_site import ForumMirror, COOKIES_FILE
+from fetchers import FETCH_ENGINES
+from page_parser import PARSER_BACKENDS
+from storage import STORAGE_BACKENDS, DirectoryStorage, PageArchive, open_storage, page_path
+from url_index import URL_INDEXES, IntSet
+
+import os
+import json
+import time
+import hashlib
+import pickle
+import shutil
+import sqlite3
+import logging
+import argparse
+import threading
+
+PENDING = 0
+CLAIMED = 1
+DONE = 2
+FAILED = 3
+STATE_NAMES = ('pending', 'claimed', 'done', 'failed')
+
+PARTITIONS = ('section', 'topic')
+
+# Logs of the shards that merge_shards concatenates
+MERGED_LOGS = ('posts.jsonl', 'visited_urls.txt')
+
+
+class SharedFrontier:
+    """
+    Crawl frontier shared by the processes of a sharded crawl, in one SQLite
+    file. Every URL is assigned to a shard when it is first queued; a shard
+    claims its pending URLs in batches and marks them done once processed, or
+    failed, to be fetched again by the next run of the shard.
+    Anything with the same methods (e.g. a queue in a database server) can
+    stand in for it when the shards run on different machines.
+    """
+
+    def __init__(self, path, timeout=60):
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS urls (
+                id INTEGER PRIMARY KEY,
+                key TEXT UNIQUE NOT NULL,
+                url TEXT NOT NULL,
+                priority INTEGER NOT NULL,
+                shard INTEGER NOT NULL,
+                state INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS urls_claim ON urls (shard, state, priority, id);
+        """)
+
+    def add(self, entries):
+        """Queue (key, url, priority, shard) entries whose key was never queued before"""
+        with self.lock:
+            self.connection.execute('BEGIN IMMEDIATE')
+            try:
+                self.connection.executemany(
+                    'INSERT OR IGNORE INTO urls (key, url, priority, shard) VALUES (?, ?, ?, ?)', entries)
+                self.connection.execute('COMMIT')
+            except Exception:
+                self.connection.execute('ROLLBACK')
+                raise
+
+    def claim(self, shard, limit):
+        """Take up to limit pending URLs of a shard, highest priority first; returns (key, url) pairs"""
+        with self.lock:
+            self.connection.execute('BEGIN IMMEDIATE')
+            try:
+                rows = self.connection.execute(
+                    'SELECT id, key, url FROM urls WHERE shard = ? AND state = ? ORDER BY priority, id LIMIT ?',
+                    (shard, PENDING, limit)).fetchall()
+                self.connection.executemany(
+                    'UPDATE urls SET state = ? WHERE id = ?', [(CLAIMED, row[0]) for row in rows])
+                self.connection.execute('COMMIT')
+            except Exception:
+                self.connection.execute('ROLLBACK')
+                raise
+        return [(key, url) for _, key, url in rows]
+
+    def complete(self, key):
+        with self.lock:
+            self.connection.execute('UPDATE urls SET state = ? WHERE key = ?', (DONE, key))
+
+    def fail(self, key):
+        with self.lock:
+            self.connection.execute('UPDATE urls SET state = ? WHERE key = ?', (FAILED, key))
+
+    def requeue(self, shard):
+        """Return the URLs a previous run of the shard failed, or had claimed but not finished when it crashed"""
+        with self.lock:
+            self.connection.execute('UPDATE urls SET state = ? WHERE shard = ? AND state IN (?, ?)',
+                                    (PENDING, shard, CLAIMED, FAILED))
+
+    def pending(self, shard):
+        with self.lock:
+            return self.connection.execute(
+                'SELECT EXISTS (SELECT 1 FROM urls WHERE shard = ? AND state = ?)', (shard, PENDING)).fetchone()[0]
+
+    def outstanding(self):
+        """Whether any shard still has URLs to fetch or is fetching one"""
+        with self.lock:
+            return self.connection.execute(
+                'SELECT EXISTS (SELECT 1 FROM urls WHERE state IN (?, ?))', (PENDING, CLAIMED)).fetchone()[0]
+
+    def done_urls(self):
+        with self.lock:
+            return [url for url, in self.connection.execute('SELECT url FROM urls WHERE state = ?', (DONE,))]
+
+    def counts(self):
+        """Number of URLs per shard and state"""
+        with self.lock:
+            return self.connection.execute(
+                'SELECT shard, state, COUNT(*) FROM urls GROUP BY shard, state ORDER BY shard, state').fetchall()
+
+    def reset(self):
+        with self.lock:
+            self.connection.execute('DELETE FROM urls')
+
+    def close(self):
+        self.connection.close()
+
+
+class ShardedFrontier:
+    """
+    One shard's view of a SharedFrontier, used by CrawlScheduler in place of a
+    Frontier: new URLs are routed to their shard, and this shard's URLs are
+    claimed a few at a time.
+    """
+
+    def __init__(self, shared, shard, key, priority, shard_of, claim_size=16, poll_interval=1.0, interner=None):
+        """
+        :param key: Callable mapping a URL to its canonical form (e.g. normalize_url)
+        :param priority: Callable mapping a URL to its priority class
+        :param shard_of: Callable mapping a URL to the shard that mirrors it
+        :param interner: URLInterner to keep the locally seen keys as integers
+        """
+        self.shared = shared
+        self.shard = shard
+        self.key = key
+        self.priority = priority
+        self.shard_of = shard_of
+        self.claim_size = claim_size
+        self.poll_interval = poll_interval
+        self.buffer = deque()
+        self.claimed = {}
+        self.interner = interner
+        self.seen = set() if interner is None else IntSet()
+
+    def __len__(self):
+        return len(self.buffer)
+
+    def push(self, url):
+        return self.extend([url])
+
+    def extend(self, urls):
+        entries = []
+        for url in urls:
+            key = self.key(url)
+            index_key = key if self.interner is None else self.interner.intern(key, url)
+            if index_key in self.seen:
+                continue
+            self.seen.add(index_key)
+            entries.append((key, url, self.priority(url), self.shard_of(url)))
+        if entries:
+            self.shared.add(entries)
+        return len(entries)
+
+    def pop(self):
+        if not self.buffer:
+            self.buffer.extend(self.shared.claim(self.shard, self.claim_size))
+            if not self.buffer:
+                return None
+        key, url = self.buffer.popleft()
+        self.claimed[url] = key
+        return url
+
+    def done(self, url):
+        key = self.claimed.pop(url, None)
+        if key is not None:
+            self.shared.complete(key)
+
+    def failed(self, url):
+        key = self.claimed.pop(url, None)
+        if key is not None:
+            self.shared.fail(key)
+
+    def more_expected(self):
+        """Wait until this shard has work again (True) or every shard is finished (False)"""
+        while True:
+            if self.shared.pending(self.shard):
+                return True
+            if not self.shared.outstanding():
+                return False
+            time.sleep(self.poll_interval)
+
+
+def shard_status(shared):
+    """
+    Progress of every shard of a SharedFrontier.
+    :return: Dict of shard number to a dict of URL counts by state name
+    """
+    status = {}
+    for shard, state, count in shared.counts():
+        status.setdefault(shard, dict.fromkeys(STATE_NAMES, 0))[STATE_NAMES[state]] = count
+    return status
+
+
+def format_shard_status(status):
+    return '\n'.join(f"shard {shard}: " + ', '.join(f"{counts[name]} {name}" for name in STATE_NAMES)
+                     for shard, counts in sorted(status.items()))
+
+
+def shard_dir(output_dir, shard):
+    return os.path.join(output_dir, 'shards', f'shard_{shard}')
+
+
+def run_shard(base_url, output_dir, frontier_path, shard, shards, partition='section', workers=4, **options):
+    """
+    Crawl one shard into output_dir/shards/shard_<n>.
+    :param frontier_path: SQLite file of the SharedFrontier
+    :param options: Further ForumMirror arguments
+    """
+    mirror = ForumMirror(base_url, shard_dir(output_dir, shard), **options)
+    if os.path.exists(COOKIES_FILE):
+        # Logged in once by crawl_sharded; the asset cache loads the same file itself
+        with open(COOKIES_FILE, 'rb') as f:
+            mirror.fetcher.load_cookies(pickle.load(f))
+    shared = SharedFrontier(frontier_path)
+    shared.requeue(shard)
+    frontier = ShardedFrontier(shared, shard, key=mirror.normalize_url, priority=mirror.url_priority,
+                               shard_of=lambda url: mirror.url_shard(url, shards, partition),
+                               interner=mirror.url_keys)
+    try:
+        mirror.mirror_forum(workers=workers, frontier=frontier)
+    finally:
+        shared.close()
+
+
+def crawl_sharded(base_url, output_dir, shards, partition='section', workers=4, only_shard=None,
+                  frontier_path=None, restart=False, login_config=None, **options):
+    """
+    Crawl the forum with one process per shard, coordinated through a shared frontier.
+    :param shards: Number of shards the forum is partitioned into
+    :param partition: 'section' (by the f parameter) or 'topic' (by a hash of the t parameter)
+    :param only_shard: Run just this shard here, e.g. when the others run on other machines
+    :param frontier_path: SharedFrontier file (default: output_dir/frontier.db)
+    :param restart: Forget the shared frontier of a previous run
+    :param login_config: Login settings; the login is done once and its cookies shared by all shards
+    :return: URL counts per shard and state, as returned by shard_status
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    frontier_path = frontier_path or os.path.join(output_dir, 'frontier.db')
+    shared = SharedFrontier(frontier_path)
+    if restart:
+        shared.reset()
+    shared.close()
+
+    if login_config:
+        mirror = ForumMirror(base_url, output_dir, login_config=login_config, **options)
+        try:
+            if not mirror.perform_login():
+                logging.error("Failed to login. Aborting sharded crawl.")
+                return
+        finally:
+            mirror.fetcher.close()
+            mirror.assets.close()
+            mirror.storage.close()
+            mirror.close_url_index()
+
+    shard_numbers = [only_shard] if only_shard is not None else range(shards)
+    processes = [
+        Process(target=run_shard, name=f"shard-{shard}",
+                args=(base_url, output_dir, frontier_path, shard, shards, partition, workers), kwargs=options)
+        for shard in shard_numbers
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+        if process.exitcode:
+            logging.error(f"{process.name} exited with code {process.exitcode}")
+
+    shared = SharedFrontier(frontier_path)
+    try:
+        status = shard_status(shared)
+    finally:
+        shared.close()
+    logging.info(f"Sharded crawl finished:\n{format_shard_status(status)}")
+    return status
+
+
+def write_merged(target, path, url, data):
+    """Write a merged page, unless an archive already holds the same copy from an earlier merge"""
+    stat = target.stat(path)
+    if stat is not None and stat[2] is not None and stat[2] == hashlib.sha1(data).hexdigest():
+        return
+    target.write(path, url, data)
+
+
+def merge_shards(output_dir, storage='directory', frontier_path=None):
+    """
+    Merge the shards of a sharded crawl into output_dir, giving the same layout
+    as a crawl by a single process: pages, assets and their index, posts.jsonl
+    and visited_urls.txt. The merged files are rebuilt from the shards, so the
+    merge can be run again.
+    :param storage: Storage backend of the merged pages
+    :param frontier_path: SharedFrontier file the URLs of pages from directory shards are looked up in
+        (default: output_dir/frontier.db)
+    :return: Number of pages merged
+    """
+    frontier_path = frontier_path or os.path.join(output_dir, 'frontier.db')
+    page_urls = {}
+    if os.path.exists(frontier_path):
+        shared = SharedFrontier(frontier_path)
+        try:
+            page_urls = {page_path(url): url for url in shared.done_urls()}
+        finally:
+            shared.close()
+    target = open_storage(storage, output_dir)
+    assets_dir = os.path.join(output_dir, 'assets')
+    assets_index = {}
+    if os.path.exists(os.path.join(assets_dir, 'index.json')):
+        with open(os.path.join(assets_dir, 'index.json'), 'r', encoding='utf-8') as f:
+            assets_index = json.load(f)
+    shards_dir = os.path.join(output_dir, 'shards')
+    names = sorted(os.listdir(shards_dir), key=lambda name: int(name.rsplit('_', 1)[1])) \
+        if os.path.isdir(shards_dir) else []
+    page_count = 0
+    # Rebuilt from the shards into temporary files, so merging again gives the same files
+    logs = {log_name: open(os.path.join(output_dir, f'{log_name}.tmp'), 'wb') for log_name in MERGED_LOGS}
+    merged_logs = set()
+    try:
+        for name in names:
+            source_dir = os.path.join(shards_dir, name)
+            archive_dir = os.path.join(source_dir, 'archive')
+            if os.path.exists(os.path.join(archive_dir, 'index.db')):
+                archive = PageArchive(archive_dir)
+                for path, url in archive.urls():
+                    write_merged(target, path, url, archive.read(path))
+                    page_count += 1
+                archive.close()
+            else:
+                source = DirectoryStorage(source_dir)
+                for path in source.paths():
+                    write_merged(target, path, page_urls.get(path), source.read(path))
+                    page_count += 1
+
+            # Assets are content addressed, so files with the same path are identical
+            source_assets = os.path.join(source_dir, 'assets')
+            for root, _, files in os.walk(source_assets):
+                for file_name in files:
+                    source_file = os.path.join(root, file_name)
+                    if file_name == 'index.json':
+                        with open(source_file, 'r', encoding='utf-8') as f:
+                            assets_index.update(json.load(f))
+                        continue
+                    target_file = os.path.join(assets_dir, os.path.relpath(source_file, source_assets))
+                    if not os.path.exists(target_file):
+                        os.makedirs(os.path.dirname(target_file), exist_ok=True)
+                        shutil.copyfile(source_file, target_file)
+
+            for log_name, target_file in logs.items():
+                if os.path.exists(os.path.join(source_dir, log_name)):
+                    with open(os.path.join(source_dir, log_name), 'rb') as source_file:
+                        shutil.copyfileobj(source_file, target_file)
+                    merged_logs.add(log_name)
+    finally:
+        target.close()
+        for target_file in logs.values():
+            target_file.close()
+    for log_name in logs:
+        if log_name in merged_logs:
+            os.replace(os.path.join(output_dir, f'{log_name}.tmp'), os.path.join(output_dir, log_name))
+        else:
+            os.remove(os.path.join(output_dir, f'{log_name}.tmp'))
+    os.makedirs(assets_dir, exist_ok=True)
+    with open(os.path.join(assets_dir, 'index.json'), 'w', encoding='utf-8') as f:
+        json.dump(assets_index, f)
+    logging.info(f"Merged {page_count} pages from {len(names)} shards")
+    return page_count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mirror a phpBB forum with several processes")
+    parser.add_argument('--output', default='mirrored_forum', help="Mirror output directory")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    crawl_parser = subparsers.add_parser('crawl', help="Crawl with one process per shard")
+    crawl_parser.add_argument('--shards', type=int, default=4)
+    crawl_parser.add_argument('--partition', choices=PARTITIONS, default='section',
+                              help="Split the forum by section, or spread topics over the shards by hash")
+    crawl_parser.add_argument('--only-shard', type=int,
+                              help="Run a single shard, for crawls spread over several machines")
+    crawl_parser.add_argument('--frontier', help="Shared frontier file (default: <output>/frontier.db)")
+    crawl_parser.add_argument('--restart', action='store_true', help="Forget the shared frontier of a previous run")
+    crawl_parser.add_argument('--engine', choices=FETCH_ENGINES, default='http')
+    crawl_parser.add_argument('--workers', type=int, default=4, help="Pages fetched concurrently per shard")
+    crawl_parser.add_argument('--rate', type=float, default=2.0,
+                              help="Maximum requests per second per host, for all shards together")
+    crawl_parser.add_argument('--max-in-flight', type=int, default=4,
+                              help="Maximum concurrent requests per host, for all shards together")
+    crawl_parser.add_argument('--parser', choices=PARSER_BACKENDS, default='html.parser')
+    crawl_parser.add_argument('--extract-posts', action='store_true')
+    crawl_parser.add_argument('--storage', choices=STORAGE_BACKENDS, default='directory')
+    crawl_parser.add_argument('--url-index', choices=URL_INDEXES, default='compact')
+
+    status_parser = subparsers.add_parser('status', help="Show the URLs done, failed and still pending per shard")
+    status_parser.add_argument('--frontier', help="Shared frontier file (default: <output>/frontier.db)")
+
+    merge_parser = subparsers.add_parser('merge', help="Merge the shards into one mirror")
+    merge_parser.add_argument('--storage', choices=STORAGE_BACKENDS, default='directory',
+                              help="Storage backend of the merged pages")
+    merge_parser.add_argument('--frontier', help="Shared frontier file (default: <output>/frontier.db)")
+    args = parser.parse_args()
+
+    if args.command == 'crawl':
+        with open('login_config.json', 'r') as f:
+            login_config = json.load(f)
+        # Each shard gets its share of the politeness budget
+        status = crawl_sharded(login_config['base_url'], args.output, args.shards, partition=args.partition,
+                               workers=args.workers, only_shard=args.only_shard, frontier_path=args.frontier,
+                               restart=args.restart, login_config=login_config, engine=args.engine,
+                               rate_limit=args.rate / args.shards,
+                               max_in_flight=max(1, args.max_in_flight // args.shards),
+                               parser=args.parser, extract_posts=args.extract_posts, storage=args.storage,
+                               url_index=args.url_index)
+        if status is not None:
+            print(format_shard_status(status))
+    elif args.command == 'status':
+        shared = SharedFrontier(args.frontier or os.path.join(args.output, 'frontier.db'))
+        try:
+            print(format_shard_status(shard_status(shared)))
+        finally:
+            shared.close()
+    elif args.command == 'merge':
+        print(f"Merged {merge_shards(args.output, args.storage, args.frontier)} pages")
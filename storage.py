@@ -0,0 +1,368 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+from datetime import datetime, timezone
+from functools import lru_cache
+
+import os
+import re
+import time
+import gzip
+import uuid
+import base64
+import sqlite3
+import hashlib
+import argparse
+import mimetypes
+import threading
+
+STORAGE_BACKENDS = ('directory', 'warc')
+
+SEGMENT_NAME = 'pages-{:05d}.warc.gz'
+SEGMENT_RE = re.compile(r'pages-(\d{5})\.warc\.gz$')
+
+
+def page_path(url):
+    """Path a page is saved at relative to the mirror output directory, mirroring the forum's structure"""
+    parsed = urlparse(url)
+    params = parse_qs(parsed.query)
+
+    if parsed.path.endswith('viewforum.php') and 'f' in params:
+        section_num = params['f'][0]
+        start_param = params.get('start', ['0'])[0]
+        if start_param == '0':
+            path = f'forum/section_{section_num}/index.html'
+        else:
+            path = f'forum/section_{section_num}/index_{start_param}.html'
+    elif parsed.path.endswith('viewtopic.php') and 't' in params:
+        topic_num = params['t'][0]
+        section_num = params.get('f', ['unknown'])[0]
+        start_param = params.get('start', ['0'])[0]
+        path = f'forum/section_{section_num}/topic_{topic_num}/page_{start_param}.html'
+    else:
+        path = parsed.path.lstrip('/')
+        if not path:
+            path = 'index.html'
+        elif not path.endswith('.html'):
+            path = os.path.join(path, 'index.html')
+    return path
+
+
+class DirectoryStorage:
+    """Saves every page as its own file below the output directory (the classic layout)."""
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+
+    def write(self, path, url, data):
+        full_path = os.path.join(self.output_dir, path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, 'wb') as f:
+            f.write(data)
+
+    def read(self, path):
+        with open(os.path.join(self.output_dir, path), 'rb') as f:
+            return f.read()
+
+    def paths(self, prefix=''):
+        """Relative paths of the stored pages below prefix"""
+        for root, _, files in os.walk(os.path.join(self.output_dir, prefix)):
+            for name in files:
+                if name.endswith('.html'):
+                    yield os.path.relpath(os.path.join(root, name), self.output_dir).replace(os.sep, '/')
+
+    def entries(self, prefix=''):
+        """(path, size, mtime_ns, None) of the pages below prefix, like PageArchive.entries"""
+        for path in self.paths(prefix):
+            yield (path,) + self.stat(path)
+
+    def stat(self, path):
+        """(size, mtime_ns, None) of a stored page, or None"""
+        try:
+            stat = os.stat(os.path.join(self.output_dir, path))
+        except FileNotFoundError:
+            return None
+        return stat.st_size, stat.st_mtime_ns, None
+
+    def close(self):
+        pass
+
+
+class PageArchive:
+    """
+    Pages stored as WARC resource records in append-only, gzip-compressed
+    segment files (one gzip member per record, so any record can be read on its
+    own), with an SQLite index from page path to segment, offset and length.
+    A page saved again is appended and the index points at the newest copy;
+    compact drops the older copies.
+    """
+
+    def __init__(self, directory, segment_size=1 << 30, readonly=False):
+        self.directory = directory
+        # Page paths are relative to the mirror output directory holding the archive
+        self.root = os.path.dirname(os.path.abspath(directory))
+        self.segment_size = segment_size
+        self.lock = threading.Lock()
+        self.segment = None
+        if not readonly:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(os.path.join(directory, 'index.db'), check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                path TEXT PRIMARY KEY,
+                url TEXT,
+                segment TEXT NOT NULL,
+                offset INTEGER NOT NULL,
+                length INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                stored_ns INTEGER NOT NULL,
+                sha1 TEXT NOT NULL
+            )
+        """)
+
+    def open_segment(self):
+        numbers = [int(m.group(1)) for m in map(SEGMENT_RE.match, os.listdir(self.directory)) if m]
+        number = max(numbers, default=0)
+        name = SEGMENT_NAME.format(number)
+        if os.path.exists(os.path.join(self.directory, name)) and \
+                os.path.getsize(os.path.join(self.directory, name)) >= self.segment_size:
+            name = SEGMENT_NAME.format(number + 1)
+        self.segment_name = name
+        self.segment = open(os.path.join(self.directory, name), 'ab')
+
+    def write(self, path, url, data):
+        digest = hashlib.sha1(data)
+        # A page merged from a shard whose URL is unknown is stored without one
+        target_uri = f'WARC-Target-URI: {url}\r\n' if url is not None else ''
+        header = (
+            'WARC/1.1\r\n'
+            'WARC-Type: resource\r\n'
+            f'WARC-Record-ID: <urn:uuid:{uuid.uuid4()}>\r\n'
+            f"WARC-Date: {datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')}\r\n"
+            f'{target_uri}'
+            f"WARC-Block-Digest: sha1:{base64.b32encode(digest.digest()).decode('ascii')}\r\n"
+            f'WARC-Mirror-Path: {path}\r\n'
+            'Content-Type: text/html; charset=utf-8\r\n'
+            f'Content-Length: {len(data)}\r\n'
+            '\r\n'
+        )
+        record = gzip.compress(header.encode('utf-8') + data + b'\r\n\r\n')
+        with self.lock:
+            if self.segment is None or self.segment.tell() >= self.segment_size:
+                if self.segment is not None:
+                    self.segment.close()
+                self.open_segment()
+            offset = self.segment.tell()
+            self.segment.write(record)
+            self.segment.flush()
+            with self.connection:
+                self.connection.execute(
+                    'INSERT OR REPLACE INTO pages (path, url, segment, offset, length, size, stored_ns, sha1) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    (path, url, self.segment_name, offset, len(record), len(data), time.time_ns(),
+                     digest.hexdigest()))
+
+    def key(self, file_path):
+        """Archive path of a page addressed as a file below the mirror output directory"""
+        return os.path.relpath(os.path.abspath(file_path), self.root).replace(os.sep, '/')
+
+    def files(self, target_directory):
+        """
+        The archived pages below target_directory, as the file paths they would have in the directory layout.
+        :return: List of (file path, size, stored_ns, sha1)
+        """
+        prefix = self.key(target_directory)
+        prefix = '' if prefix == '.' else prefix + '/'
+        return [(os.path.join(target_directory, path[len(prefix):]), size, stored_ns, sha1)
+                for path, size, stored_ns, sha1 in self.entries(prefix)]
+
+    def lookup(self, path):
+        with self.lock:
+            return self.connection.execute(
+                'SELECT segment, offset, length FROM pages WHERE path = ?', (path,)).fetchone()
+
+    def read(self, path):
+        """Read one page by random access; raises KeyError if the archive does not hold it"""
+        entry = self.lookup(path)
+        if entry is None:
+            raise KeyError(path)
+        segment, offset, length = entry
+        with open(os.path.join(self.directory, segment), 'rb') as f:
+            f.seek(offset)
+            record = gzip.decompress(f.read(length))
+        header, _, body = record.partition(b'\r\n\r\n')
+        content_length = int(re.search(rb'Content-Length: (\d+)', header).group(1))
+        return body[:content_length]
+
+    def entries(self, prefix=''):
+        """(path, size, stored_ns, sha1) of the pages below prefix, in path order"""
+        with self.lock:
+            rows = self.connection.execute(
+                'SELECT path, size, stored_ns, sha1 FROM pages WHERE path >= ? AND path < ? ORDER BY path',
+                (prefix, prefix + '\uffff')).fetchall()
+        return rows
+
+    def paths(self, prefix=''):
+        return [row[0] for row in self.entries(prefix)]
+
+    def urls(self, prefix=''):
+        """(path, url) of the pages below prefix"""
+        with self.lock:
+            return self.connection.execute(
+                'SELECT path, url FROM pages WHERE path >= ? AND path < ? ORDER BY path',
+                (prefix, prefix + '\uffff')).fetchall()
+
+    def url(self, path):
+        """URL a stored page was fetched from"""
+        with self.lock:
+            row = self.connection.execute('SELECT url FROM pages WHERE path = ?', (path,)).fetchone()
+        return row[0] if row else None
+
+    def stat(self, path):
+        """(size, stored_ns, sha1) of a stored page"""
+        with self.lock:
+            return self.connection.execute(
+                'SELECT size, stored_ns, sha1 FROM pages WHERE path = ?', (path,)).fetchone()
+
+    def segment_names(self):
+        return sorted(name for name in os.listdir(self.directory) if SEGMENT_RE.match(name))
+
+    def compact(self):
+        """
+        Copy the newest record of every page into new segments and delete the old
+        segments, dropping the copies that later writes superseded. Nothing else
+        may write to or read from the archive meanwhile.
+        :return: Segment bytes before and after
+        """
+        with self.lock:
+            if self.segment is not None:
+                self.segment.close()
+                self.segment = None
+            old_names = self.segment_names()
+            before = sum(os.path.getsize(os.path.join(self.directory, name)) for name in old_names)
+            rows = self.connection.execute(
+                'SELECT path, segment, offset, length FROM pages ORDER BY segment, offset').fetchall()
+            number = max((int(SEGMENT_RE.match(name).group(1)) for name in old_names), default=0) + 1
+            moved = []
+            target = None
+            source_name, source = None, None
+            try:
+                for path, segment, offset, length in rows:
+                    if target is None or target.tell() >= self.segment_size:
+                        if target is not None:
+                            target.close()
+                        target_name = SEGMENT_NAME.format(number)
+                        target = open(os.path.join(self.directory, target_name), 'wb')
+                        number += 1
+                    if segment != source_name:
+                        if source is not None:
+                            source.close()
+                        source_name, source = segment, open(os.path.join(self.directory, segment), 'rb')
+                    source.seek(offset)
+                    # Records are separate gzip members, so they are copied without recompressing
+                    moved.append((target_name, target.tell(), path))
+                    target.write(source.read(length))
+            finally:
+                if source is not None:
+                    source.close()
+                if target is not None:
+                    target.close()
+            # The old segments are only deleted once the index points at the new ones
+            with self.connection:
+                self.connection.executemany('UPDATE pages SET segment = ?, offset = ? WHERE path = ?', moved)
+            live = {name for name, _, _ in moved}
+            for name in old_names:
+                if name not in live:
+                    os.remove(os.path.join(self.directory, name))
+            after = sum(os.path.getsize(os.path.join(self.directory, name)) for name in self.segment_names())
+        return before, after
+
+    def close(self):
+        with self.lock:
+            if self.segment is not None:
+                self.segment.close()
+                self.segment = None
+            self.connection.close()
+
+
+def open_storage(backend, output_dir):
+    """
+    Page storage of a mirror.
+    :param backend: 'directory' (one file per page) or 'warc' (compressed archive in output_dir/archive)
+    """
+    if backend == 'directory':
+        return DirectoryStorage(output_dir)
+    if backend == 'warc':
+        return PageArchive(os.path.join(output_dir, 'archive'))
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+
+@lru_cache(maxsize=None)
+def archive_for_process(directory, pid):
+    return PageArchive(directory, readonly=True)
+
+
+def open_archive(directory):
+    """Read-only archive handle, opened once per process (SQLite connections must not cross a fork)"""
+    return archive_for_process(directory, os.getpid())
+
+
+def make_viewer_handler(archive):
+    class ViewerHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            path = unquote(urlparse(self.path).path).lstrip('/') or 'index.html'
+            if path.endswith('/'):
+                path += 'index.html'
+            try:
+                body = archive.read(path)
+                content_type = 'text/html; charset=utf-8'
+            except KeyError:
+                # Assets are stored as files next to the archive
+                full_path = os.path.normpath(os.path.join(archive.root, path))
+                if not full_path.startswith(archive.root + os.sep) or not os.path.isfile(full_path):
+                    self.send_error(404)
+                    return
+                with open(full_path, 'rb') as f:
+                    body = f.read()
+                content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return ViewerHandler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or browse a mirror stored as a WARC archive")
+    parser.add_argument('archive', nargs='?', default='mirrored_forum/archive', help="Archive directory")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    list_parser = subparsers.add_parser('list', help="List the stored pages")
+    list_parser.add_argument('prefix', nargs='?', default='')
+    cat_parser = subparsers.add_parser('cat', help="Print one page")
+    cat_parser.add_argument('path', help="Page path, e.g. forum/section_1/topic_2/page_0.html")
+    serve_parser = subparsers.add_parser('serve', help="Browse the mirror offline")
+    serve_parser.add_argument('--port', type=int, default=8080)
+    subparsers.add_parser('compact', help="Drop the superseded copies of rewritten pages")
+    args = parser.parse_args()
+
+    if args.command == 'list':
+        for path, size, _, _ in open_archive(args.archive).entries(args.prefix):
+            print(f"{size:>9}  {path}")
+    elif args.command == 'cat':
+        print(open_archive(args.archive).read(args.path).decode('utf-8'))
+    elif args.command == 'serve':
+        server = ThreadingHTTPServer(('127.0.0.1', args.port), make_viewer_handler(open_archive(args.archive)))
+        print(f"Browse the mirror at http://127.0.0.1:{args.port}/")
+        server.serve_forever()
+    elif args.command == 'compact':
+        archive = PageArchive(args.archive)
+        try:
+            before, after = archive.compact()
+        finally:
+            archive.close()
+        print(f"Compacted {args.archive}: {before} -> {after} bytes")
@@ -1,95 +1,387 @@
 import os
 import json
 import re
+import time
+import sqlite3
+import argparse
+import hashlib
+import itertools
 from bs4 import BeautifulSoup
+from search_index import SearchIndex
+from storage import open_archive
+from parallel import map_batches
+from extraction_profiles import PROFILES, detect_profile, get_profile
 
-def process_html_file(file_path):
+TOPIC_RE = re.compile(r'topic_(\d+)')
+
+def extract_posts(soup, topic_id, posts=None, profile=None):
+    """
+    Extracts every post of a parsed topic page.
+    :param soup: Parsed topic page
+    :param topic_id: Topic number of the page
+    :param posts: The page's post elements, if already collected
+    :param profile: Theme profile (see extraction_profiles.py); detected from the page by default
+    :return: A list of dictionaries with structured data for each post
+    """
+    profile = get_profile(profile) or detect_profile(soup, posts)
+    if posts and not all(profile.post.match(post) for post in posts):
+        posts = None  # Collected for another theme; the profile selects its own posts
+    return profile.extract(soup, topic_id, posts)
+
+def process_html_file(file_path, archive=None, profile=None):
     """
     Processes an individual HTML file to extract posts and replies.
     :param file_path: Path to the HTML file
+    :param archive: PageArchive to read the page from instead of the file system
+    :param profile: Theme profile name or JSON file; detected from the page by default
     :return: A list of dictionaries with structured data for each post
     """
-    data = []
-    
+    match = TOPIC_RE.search(file_path)
+    topic_id = match.group(1) if match else None
+    if archive is not None:
+        return extract_posts(BeautifulSoup(archive.read(archive.key(file_path)), 'html.parser'), topic_id,
+                             profile=profile)
     with open(file_path, 'r', encoding='utf-8') as file:
         soup = BeautifulSoup(file, 'html.parser')
-        match = re.search(r'topic_(\d+)', file_path)
-        if match:
-            topic_id = match.group(1)
-            print(f"Topic Number: {topic_id}")
-        else:
-            print("Topic number not found.")
+        return extract_posts(soup, topic_id, profile=profile)
 
-        topic_title = soup.head.title.text if soup.head and soup.head.title else 'No Title'
-        print(f"Topic Title: {topic_title}")
+def process_html_files(file_paths, archive_dir=None, profile=None):
+    """
+    Processes a batch of HTML files in a worker process.
+    :param file_paths: Paths of the HTML files
+    :param archive_dir: WARC archive of the mirror (see storage.py), if pages are not stored as files
+    :param profile: Theme profile name or JSON file; detected per page by default
+    :return: (list of (path, posts) per file, list of (path, error) for files that failed)
+    """
+    archive = open_archive(archive_dir) if archive_dir else None
+    results = []
+    errors = []
+    for file_path in file_paths:
+        try:
+            results.append((file_path, process_html_file(file_path, archive, profile)))
+        except Exception as e:
+            errors.append((file_path, str(e)))
+    return results, errors
+
+def find_html_files(target_directory):
+    """
+    Lazily yields every HTML file below the target directory.
+    :param target_directory: The top-level directory containing HTML files in nested folders
+    """
+    for root, dirs, files in os.walk(target_directory):
+        for file in files:
+            if file.endswith(".html"):  # Only process HTML files
+                yield os.path.join(root, file)
 
+def find_page_files(target_directory, archive_dir=None):
+    """
+    The pages below the target directory, from the file system or from the mirror's archive.
+    :param target_directory: The top-level directory containing HTML files in nested folders
+    :param archive_dir: WARC archive of the mirror, if pages are not stored as files
+    """
+    if archive_dir:
+        return (file_path for file_path, _, _, _ in open_archive(archive_dir).files(target_directory))
+    return find_html_files(target_directory)
 
-        # Example extraction logic for posts and replies
-        posts = soup.find_all('article', role='article')  # Adjust based on actual HTML structure
-        for post in posts:
-            # Find the parent div with class 'clearfix'
-            parent_div = post.find_parent('div', class_='clearfix')
-
-            if parent_div and parent_div.has_attr('id'):
-                post_id = parent_div['id']  # Get the id attribute of the parent div
-                print(f"post ID: {post_id}")
-            else:
-                print("Parent div with class 'clearfix' or id attribute not found.")
-
-            panelHeading = post.find('div', class_='panel-heading') 
-            panelBody = post.find('div', class_='panel-body')
-            # Assuming `element` contains the parsed HTML of the div with class "panel-heading"
-            post_title = panelHeading.find('h3').find('a').text
-            post_author = panelHeading.find('a', class_='username-coloured')  # Try finding in <a> tag first
-
-            # If <a> tag is not found, look for <span> with class "username-coloured"
-            if post_author is None:
-                post_author = panelHeading.find('span', class_='username-coloured')
-
-            # Extract the text if the tag was found
-            post_author = post_author.text.strip() if post_author else "Author not found"
-
-            timestamp = panelHeading.find('span', class_='hidden-xs').text.strip()
-            # content = panelBody.find('div', class_='content').text.strip()
-            content_div = panelBody.find('div', class_='content')
-            content_text = ' '.join(content_div.stripped_strings)
-            content_text = re.sub(r"- (Thứ \d|Chủ nhật) Tháng \d{1,2} \d{2}, \d{4} \d{1,2}:\d{2} (am|pm)", "", content_text).strip()
-            print(content_text)
-            print("POST TITLE: ")
-            print(post_title)
-            print(timestamp)
-            print(post_author)
-            data.append({
-                'topic_id': topic_id,
-                'topic_title': topic_title,
-                'post_id': post_id,
-                'post_title': post_title,
-                'author': post_author,
-                'content': content_text,
-                'timestamp': timestamp,
-            })
-    return data
-
-def process_nested_directories(target_directory):
+def page_stats(target_directory, archive_dir=None):
+    """
+    Yields (path, size, version, hash) of every page. The version is the mtime for
+    files and the time stored for archived pages; the hash is only known for the latter.
+    """
+    if archive_dir:
+        yield from open_archive(archive_dir).files(target_directory)
+        return
+    for file_path in find_html_files(target_directory):
+        stat = os.stat(file_path)
+        yield file_path, stat.st_size, stat.st_mtime_ns, None
+
+def page_stat(file_path, archive_dir=None):
+    """(size, version, hash) of one page"""
+    if archive_dir:
+        archive = open_archive(archive_dir)
+        return archive.stat(archive.key(file_path))
+    stat = os.stat(file_path)
+    return stat.st_size, stat.st_mtime_ns, file_hash(file_path)
+
+def extract_parallel(file_paths, workers=None, batch_size=32, archive_dir=None, profile=None):
+    """
+    Runs process_html_files over a process pool with parallel.map_batches.
+    :param file_paths: Iterable of HTML file paths
+    :param workers: Number of worker processes (default: one per CPU); 1 runs in this process
+    :param batch_size: Files per task
+    :param archive_dir: WARC archive of the mirror, if pages are not stored as files
+    :param profile: Theme profile name or JSON file; detected per page by default
+    :return: Generator of (list of (path, posts), errors) per batch, in completion order
+    """
+    return map_batches(process_html_files, file_paths, (archive_dir, profile), workers, batch_size)
+
+def process_nested_directories(target_directory, workers=1, archive_dir=None, profile=None):
     """
     Iterates through all nested directories to find HTML files and process them.
     :param target_directory: The top-level directory containing HTML files in nested folders
+    :param workers: Number of worker processes
+    :param archive_dir: WARC archive of the mirror, if pages are not stored as files
+    :param profile: Theme profile name or JSON file; detected per page by default
     :return: A list of all extracted posts and replies across all HTML files
     """
     all_data = []
+    for results, errors in extract_parallel(find_page_files(target_directory, archive_dir), workers=workers,
+                                            archive_dir=archive_dir, profile=profile):
+        for file_path, file_data in results:
+            all_data.extend(file_data)  # Add each file's data to the main list
+        for file_path, error in errors:
+            print(f"Failed to process {file_path}: {error}")
+    return all_data
 
-    # Traverse the entire directory structure
-    for root, dirs, files in os.walk(target_directory):
-        for file in files:
-            print("the file inside of files is: ")
-            print(file)
-            if file.endswith(".html"):  # Only process HTML files
-                file_path = os.path.join(root, file)
-                print(f"Processing file: {file_path}")
-                file_data = process_html_file(file_path)  # Process each found HTML file
-                all_data.extend(file_data)  # Add each file's data to the main list
+class JsonLinesWriter:
+    """Streams posts to a JSON Lines file, one post per line."""
 
-    return all_data
+    def __init__(self, output_file):
+        self.file = open(output_file, 'w', encoding='utf-8')
+
+    def write(self, posts):
+        self.file.write(''.join(json.dumps(post, ensure_ascii=False) + '\n' for post in posts))
+
+    def close(self):
+        self.file.close()
+
+class JsonArrayWriter:
+    """Streams posts into a single JSON array, the format save_to_json writes."""
+
+    def __init__(self, output_file):
+        self.file = open(output_file, 'w', encoding='utf-8')
+        self.file.write('[')
+        self.first = True
+
+    def write(self, posts):
+        for post in posts:
+            self.file.write(('\n' if self.first else ',\n') + json.dumps(post, ensure_ascii=False))
+            self.first = False
+
+    def close(self):
+        self.file.write('\n]\n')
+        self.file.close()
+
+class SQLiteWriter:
+    """Streams posts into a `posts` table of an SQLite database."""
+
+    def __init__(self, output_file):
+        self.connection = sqlite3.connect(output_file)
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS posts (topic_id TEXT, topic_title TEXT, post_id TEXT, '
+            'post_title TEXT, author TEXT, content TEXT, timestamp TEXT)')
+        with self.connection:
+            self.connection.execute('DELETE FROM posts')  # Replace the previous output, like the file writers
+
+    def write(self, posts):
+        with self.connection:
+            self.connection.executemany(
+                'INSERT INTO posts VALUES (:topic_id, :topic_title, :post_id, :post_title, '
+                ':author, :content, :timestamp)', posts)
+
+    def close(self):
+        self.connection.close()
+
+class ParquetWriter:
+    """Streams posts into a Parquet file, one row group per batch (requires pyarrow)."""
+
+    def __init__(self, output_file):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise SystemExit("Parquet output requires pyarrow: pip install pyarrow")
+        self.pyarrow = pyarrow
+        fields = ['topic_id', 'topic_title', 'post_id', 'post_title', 'author', 'content', 'timestamp']
+        self.schema = pyarrow.schema([(field, pyarrow.string()) for field in fields])
+        self.writer = pyarrow.parquet.ParquetWriter(output_file, self.schema)
+
+    def write(self, posts):
+        if posts:
+            self.writer.write_table(self.pyarrow.Table.from_pylist(posts, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+OUTPUT_WRITERS = {
+    'jsonl': JsonLinesWriter,
+    'json': JsonArrayWriter,
+    'sqlite': SQLiteWriter,
+    'parquet': ParquetWriter,
+}
+
+def extract_to_file(target_directory, output_file, output_format='jsonl', workers=None, search_index=None,
+                    archive_dir=None, profile=None):
+    """
+    Extracts every post below target_directory in parallel and streams them to output_file.
+    :param target_directory: The top-level directory containing HTML files in nested folders
+    :param output_file: Path of the output file
+    :param output_format: One of OUTPUT_WRITERS
+    :param workers: Number of worker processes (default: one per CPU)
+    :param search_index: SearchIndex to add the posts to as they are extracted
+    :param archive_dir: WARC archive of the mirror, if pages are not stored as files
+    :param profile: Theme profile name or JSON file; detected per page by default
+    :return: (number of posts written, number of files that failed)
+    """
+    writer = OUTPUT_WRITERS[output_format](output_file)
+    post_count = 0
+    failed = 0
+    try:
+        for results, errors in extract_parallel(find_page_files(target_directory, archive_dir), workers=workers,
+                                                archive_dir=archive_dir, profile=profile):
+            for file_path, posts in results:
+                writer.write(posts)
+                post_count += len(posts)
+            if search_index:
+                search_index.replace(results)
+            failed += len(errors)
+            for file_path, error in errors:
+                print(f"Failed to process {file_path}: {error}")
+    finally:
+        writer.close()
+    return post_count, failed
+
+class ExtractionManifest:
+    """
+    Remembers, per HTML file, its size, mtime and content hash and the posts
+    extracted from it, so later runs only parse new or modified files and drop
+    the posts of deleted ones.
+    """
+
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                hash TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS posts (
+                path TEXT NOT NULL,
+                post_id TEXT,
+                record TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS posts_path ON posts (path);
+        """)
+
+    def known_files(self):
+        return {path: (size, mtime_ns, digest) for path, size, mtime_ns, digest in
+                self.connection.execute('SELECT path, size, mtime_ns, hash FROM files')}
+
+    def plan(self, target_directory, archive_dir=None):
+        """
+        Compares the files on disk (or in the archive) with the manifest.
+        :param target_directory: The top-level directory containing HTML files in nested folders
+        :param archive_dir: WARC archive of the mirror, if pages are not stored as files
+        :return: (paths to parse, paths deleted since the last run)
+        """
+        known = self.known_files()
+        changed = []
+        touched = []
+        for file_path, size, version, digest in page_stats(target_directory, archive_dir):
+            previous = known.pop(file_path, None)
+            if previous and previous[:2] == (size, version):
+                continue
+            if previous and previous[0] == size and (digest or file_hash(file_path)) == previous[2]:
+                # Rewritten with the same content, e.g. by an incremental crawl
+                touched.append((version, file_path))
+                continue
+            changed.append(file_path)
+        with self.connection:
+            self.connection.executemany('UPDATE files SET mtime_ns = ? WHERE path = ?', touched)
+        return changed, list(known)
+
+    def remove(self, file_paths):
+        with self.connection:
+            for file_path in file_paths:
+                self.connection.execute('DELETE FROM posts WHERE path = ?', (file_path,))
+                self.connection.execute('DELETE FROM files WHERE path = ?', (file_path,))
+
+    def update(self, results, archive_dir=None):
+        """
+        Replaces the posts of freshly parsed files.
+        :param results: List of (path, posts)
+        :param archive_dir: WARC archive the files were read from, if any
+        """
+        with self.connection:
+            for file_path, posts in results:
+                size, version, digest = page_stat(file_path, archive_dir)
+                self.connection.execute('DELETE FROM posts WHERE path = ?', (file_path,))
+                self.connection.executemany(
+                    'INSERT INTO posts (path, post_id, record) VALUES (?, ?, ?)',
+                    [(file_path, post['post_id'], json.dumps(post, ensure_ascii=False)) for post in posts])
+                self.connection.execute(
+                    'INSERT OR REPLACE INTO files (path, size, mtime_ns, hash) VALUES (?, ?, ?, ?)',
+                    (file_path, size, version, digest))
+
+    def iter_file_posts(self):
+        """Yields (path, posts) for every file in the manifest"""
+        cursor = self.connection.execute('SELECT path, record FROM posts ORDER BY path, rowid')
+        for file_path, rows in itertools.groupby(cursor, key=lambda row: row[0]):
+            yield file_path, [json.loads(record) for _, record in rows]
+
+    def iter_posts(self, batch_size=1000):
+        """Yields the posts of every file in batches, in path order"""
+        cursor = self.connection.execute('SELECT record FROM posts ORDER BY path, rowid')
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            yield [json.loads(record) for record, in rows]
+
+    def close(self):
+        self.connection.close()
+
+def file_hash(file_path):
+    with open(file_path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+def extract_incremental(target_directory, output_file, manifest_file, output_format='jsonl', workers=None,
+                        search_index=None, archive_dir=None, profile=None):
+    """
+    Parses only the files that changed since the previous run, then rewrites the
+    output from the manifest, which holds the posts of every file.
+    :param target_directory: The top-level directory containing HTML files in nested folders
+    :param output_file: Path of the output file
+    :param manifest_file: Path of the manifest database
+    :param output_format: One of OUTPUT_WRITERS
+    :param workers: Number of worker processes (default: one per CPU)
+    :param search_index: SearchIndex kept in step with the manifest
+    :param archive_dir: WARC archive of the mirror, if pages are not stored as files
+    :param profile: Theme profile name or JSON file; detected per page by default
+    :return: (number of posts written, files parsed, files removed, files that failed)
+    """
+    manifest = ExtractionManifest(manifest_file)
+    try:
+        if search_index and search_index.is_empty():
+            # A new index starts with everything extracted by earlier runs
+            search_index.replace(manifest.iter_file_posts())
+        changed, deleted = manifest.plan(target_directory, archive_dir)
+        manifest.remove(deleted)
+        if search_index:
+            search_index.remove(deleted)
+        failed = 0
+        for results, errors in extract_parallel(changed, workers=workers, archive_dir=archive_dir,
+                                                profile=profile):
+            manifest.update(results, archive_dir)
+            if search_index:
+                search_index.replace(results)
+            failed += len(errors)
+            for file_path, error in errors:
+                print(f"Failed to process {file_path}: {error}")
+
+        writer = OUTPUT_WRITERS[output_format](output_file)
+        post_count = 0
+        try:
+            for posts in manifest.iter_posts():
+                writer.write(posts)
+                post_count += len(posts)
+        finally:
+            writer.close()
+    finally:
+        manifest.close()
+    return post_count, len(changed), len(deleted), failed
 
 def save_to_json(data, output_file='structured_data.json'):
     """
@@ -103,9 +395,38 @@ def save_to_json(data, output_file='structured_data.json'):
 
 # Main execution
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract structured post data from a mirrored forum")
     # Path to your main directory
-    target_directory = './mirrored_forum/forum'
-    
-    # Process directories and save results
-    extracted_data = process_nested_directories(target_directory)
-    save_to_json(extracted_data)
+    parser.add_argument('target_directory', nargs='?', default='./mirrored_forum/forum')
+    parser.add_argument('--format', choices=sorted(OUTPUT_WRITERS), default='jsonl')
+    parser.add_argument('--output', help="Output file (default: structured_data.<format>)")
+    parser.add_argument('--workers', type=int, help="Worker processes (default: one per CPU)")
+    parser.add_argument('--full', action='store_true',
+                        help="Parse every file instead of only those changed since the last run")
+    parser.add_argument('--manifest', default='structured_data.manifest.db',
+                        help="Manifest of already extracted files used by incremental runs")
+    parser.add_argument('--index', nargs='?', const='search_index.db',
+                        help="Also maintain the full-text search index used by search_index.py")
+    parser.add_argument('--archive', nargs='?', const='./mirrored_forum/archive',
+                        help="Read the pages from the WARC archive of a mirror crawled with --storage warc")
+    parser.add_argument('--profile', help=f"Theme profile ({', '.join(PROFILES)}) or a JSON file with one; "
+                                          "detected per page by default. Run with --full after changing it")
+    args = parser.parse_args()
+
+    search_index = SearchIndex(args.index) if args.index else None
+
+    output_file = args.output or f"structured_data.{'db' if args.format == 'sqlite' else args.format}"
+    start = time.perf_counter()
+    if args.full:
+        post_count, failed = extract_to_file(args.target_directory, output_file, args.format, args.workers,
+                                             search_index, args.archive, args.profile)
+        summary = f"{failed} files failed"
+    else:
+        post_count, parsed, removed, failed = extract_incremental(
+            args.target_directory, output_file, args.manifest, args.format, args.workers, search_index,
+            args.archive, args.profile)
+        summary = f"{parsed} files parsed, {removed} removed, {failed} failed"
+    elapsed = time.perf_counter() - start
+    if search_index:
+        search_index.close()
+    print(f"Saved {post_count} posts to {output_file} in {elapsed:.1f}s ({summary})")
@@ -0,0 +1,118 @@
+from urllib.parse import parse_qs
+from unittest import mock
+
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+import mirror_site
+from crawl_state import CrawlState, PENDING, VISITED
+from fixture_server import FixtureBoard, start_fixture_server
+
+
+class SnapshotState(CrawlState):
+    """Flushes after every update and copies the database after each flush, as a crash right then would leave it"""
+
+    snapshots = []
+
+    def __init__(self, path):
+        super().__init__(path, batch_size=1)
+
+    def write_batch(self):
+        super().write_batch()
+        snapshot = f"{self.path}.{len(self.snapshots)}"
+        target = sqlite3.connect(snapshot)
+        self.connection.backup(target)
+        target.close()
+        self.snapshots.append(snapshot)
+
+
+class FlakyBoard(FixtureBoard):
+    """Answers the first request for one topic page with a server error"""
+
+    def __init__(self, failing_topic, **kwargs):
+        super().__init__(**kwargs)
+        self.failing_topic = failing_topic
+        self.failures = 0
+
+    def render(self, path, query):
+        params = parse_qs(query)
+        if path == '/viewtopic.php' and params.get('t') == [str(self.failing_topic)] and 'start' not in params \
+                and not self.failures:
+            self.failures += 1
+            return 500, 'text/html; charset=utf-8', b'<html><body>Internal error</body></html>'
+        return super().render(path, query)
+
+
+def journaled_keys(path, state):
+    connection = sqlite3.connect(path)
+    try:
+        return {row[0] for row in connection.execute('SELECT key FROM urls WHERE state = ?', (state,))}
+    finally:
+        connection.close()
+
+
+class ResumeTest(unittest.TestCase):
+    def setUp(self):
+        self.server = start_fixture_server(FixtureBoard(sections=2, topics_per_section=8, topics_per_page=5))
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def crawl(self, output_dir, state_class=CrawlState, workers=2):
+        with mock.patch.object(mirror_site, 'CrawlState', state_class):
+            mirror = mirror_site.ForumMirror(self.server.base_url, output_dir, rate_limit=1000)
+            mirror.mirror_forum(workers=workers, progress_interval=0)
+        return journaled_keys(os.path.join(output_dir, 'crawl_state.db'), VISITED)
+
+    def test_resume_after_crash_mirrors_every_page(self):
+        SnapshotState.snapshots = []
+        full = self.crawl(os.path.join(self.directory, 'full'), SnapshotState)
+        snapshots = list(SnapshotState.snapshots)
+        self.assertEqual(len(full), len(FixtureBoard(sections=2, topics_per_section=8, topics_per_page=5).page_urls()))
+        self.assertGreater(len(snapshots), len(full))
+
+        for i, snapshot in enumerate(snapshots[::6]):
+            with self.subTest(snapshot=snapshot):
+                output_dir = os.path.join(self.directory, f'resumed_{i}')
+                os.makedirs(output_dir)
+                shutil.copy(snapshot, os.path.join(output_dir, 'crawl_state.db'))
+                self.assertEqual(self.crawl(output_dir, workers=1), full)
+
+
+class FailedPageTest(unittest.TestCase):
+    def setUp(self):
+        self.board = FlakyBoard(failing_topic=3, sections=1, topics_per_section=6)
+        self.server = start_fixture_server(self.board)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.output_dir = directory.name
+
+    def crawl(self):
+        mirror = mirror_site.ForumMirror(self.server.base_url, self.output_dir, rate_limit=1000)
+        mirror.mirror_forum(workers=2, progress_interval=0)
+        state_file = os.path.join(self.output_dir, 'crawl_state.db')
+        return journaled_keys(state_file, VISITED), journaled_keys(state_file, PENDING)
+
+    def test_resumed_crawl_fetches_a_failed_page(self):
+        page = os.path.join(self.output_dir, 'forum', 'section_1', 'topic_3', 'page_0.html')
+        visited, pending = self.crawl()
+        self.assertEqual(self.board.failures, 1)
+        self.assertEqual(len(pending), 1)
+        self.assertIn('t=3', next(iter(pending)))
+        self.assertFalse(os.path.exists(page))
+
+        visited, pending = self.crawl()
+        self.assertEqual(pending, set())
+        self.assertEqual(len(visited), len(self.board.page_urls()))
+        self.assertTrue(os.path.exists(page))
+
+
+if __name__ == '__main__':
+    unittest.main()
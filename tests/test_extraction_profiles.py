@@ -0,0 +1,32 @@
+from bs4 import BeautifulSoup
+
+import unittest
+
+from extraction_profiles import PROFILES
+from fixture_server import FixtureBoard
+from page_parser import parse_page
+from structured_data import extract_posts
+
+TOPIC_URL = 'http://127.0.0.1:8000/viewtopic.php?f=1&t=1'
+
+
+class CrawlTimeExtractionTest(unittest.TestCase):
+    def setUp(self):
+        # The fixture posts are <div class="post"> elements wrapping an <article role="article">
+        self.html = FixtureBoard().render_topic(1, 1, 0)
+
+    def test_crawl_time_and_offline_extraction_agree(self):
+        for profile in [None] + list(PROFILES):
+            with self.subTest(profile=profile):
+                crawled = parse_page(self.html, TOPIC_URL, topic_id='1', profile=profile).posts
+                offline = extract_posts(BeautifulSoup(self.html, 'html.parser'), '1', profile=profile)
+                self.assertEqual(crawled, offline)
+                self.assertEqual(len(crawled), 10)
+
+    def test_forced_profile_selects_its_own_posts(self):
+        posts = parse_page(self.html, TOPIC_URL, topic_id='1', profile='prosilver').posts
+        self.assertEqual([post['post_id'] for post in posts], [f'p{1000 + index}' for index in range(10)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import unittest
+
+import requests
+
+from fetchers import FallbackFetcher, HttpFetcher
+from fixture_server import FixtureBoard, start_fixture_server
+
+
+class RecordingFetcher:
+    """Stands in for the Selenium fetcher and records the pages handed to it"""
+
+    def __init__(self):
+        self.urls = []
+
+    def fetch(self, url):
+        self.urls.append(url)
+        return '<html><body>rendered</body></html>'
+
+
+class ChallengeFetcher:
+    """Answers every page with a 403 anti-bot interstitial"""
+
+    def fetch(self, url):
+        response = requests.Response()
+        response.status_code = 403
+        response._content = b'<html><body><div id="challenge-platform">Checking your browser</div></body></html>'
+        response.url = url
+        raise requests.HTTPError('403 Client Error: Forbidden', response=response)
+
+
+class FallbackFetcherTest(unittest.TestCase):
+    def setUp(self):
+        self.server = start_fixture_server(FixtureBoard(sections=1, topics_per_section=2))
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.browser = RecordingFetcher()
+
+    def test_http_errors_do_not_start_a_browser(self):
+        fetcher = FallbackFetcher(HttpFetcher(cookies_file=None), self.browser)
+        self.addCleanup(fetcher.primary.close)
+        with self.assertRaises(requests.HTTPError) as raised:
+            fetcher.fetch(f'{self.server.base_url}missing.php')
+        self.assertEqual(raised.exception.response.status_code, 404)
+        self.assertEqual(self.browser.urls, [])
+        self.assertEqual(fetcher.fallback_count, 0)
+
+    def test_connection_errors_do_not_start_a_browser(self):
+        fetcher = FallbackFetcher(HttpFetcher(cookies_file=None, timeout=2), self.browser)
+        self.addCleanup(fetcher.primary.close)
+        with self.assertRaises(requests.ConnectionError):
+            fetcher.fetch('http://127.0.0.1:9/viewtopic.php?t=1')
+        self.assertEqual(self.browser.urls, [])
+
+    def test_pages_are_fetched_over_http(self):
+        fetcher = FallbackFetcher(HttpFetcher(cookies_file=None), self.browser)
+        self.addCleanup(fetcher.primary.close)
+        self.assertIn('Section 1', fetcher.fetch(f'{self.server.base_url}viewforum.php?f=1'))
+        self.assertEqual(self.browser.urls, [])
+
+    def test_challenge_page_falls_back_to_the_browser(self):
+        fetcher = FallbackFetcher(ChallengeFetcher(), self.browser)
+        self.assertEqual(fetcher.fetch('https://example.com/viewtopic.php?t=1'), '<html><body>rendered</body></html>')
+        self.assertEqual(self.browser.urls, ['https://example.com/viewtopic.php?t=1'])
+        self.assertEqual(fetcher.fallback_count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
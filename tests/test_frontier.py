@@ -0,0 +1,29 @@
+import unittest
+
+from frontier import Frontier
+from url_index import URLInterner
+
+BASE_URL = 'https://example.com/forum/'
+
+
+class InternedFrontierTest(unittest.TestCase):
+    def setUp(self):
+        self.interner = URLInterner(BASE_URL)
+        self.frontier = Frontier(interner=self.interner)
+
+    def test_membership_checks_do_not_intern(self):
+        self.frontier.push(f'{BASE_URL}index.php')
+        strings = list(self.interner.strings)
+        self.assertIn(f'{BASE_URL}index.php', self.frontier)
+        self.assertNotIn(f'{BASE_URL}faq.php', self.frontier)
+        self.assertNotIn(f'{BASE_URL}viewtopic.php?t=5', self.frontier)
+        self.assertEqual(self.interner.strings, strings)
+
+    def test_packed_urls(self):
+        self.frontier.push(f'{BASE_URL}viewtopic.php?f=1&t=5')
+        self.assertIn(f'{BASE_URL}viewtopic.php?f=1&t=5', self.frontier)
+        self.assertEqual(self.frontier.pop(), f'{BASE_URL}viewtopic.php?f=1&t=5')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import os
+import tempfile
+import unittest
+
+from link_rewriter import rewrite_mirror_links
+from storage import DirectoryStorage, page_path
+
+BASE_URL = 'https://exampleforum.com/forum/'
+
+PAGES = {
+    BASE_URL: '<html><body><a href="./viewforum.php?f=1">Section 1</a></body></html>',
+    f'{BASE_URL}viewforum.php?f=1': (
+        '<html><body><a href="./index.php">Board index</a>'
+        '<a href="./viewtopic.php?f=1&amp;t=2">Topic 2</a></body></html>'
+    ),
+    f'{BASE_URL}viewtopic.php?f=1&t=2': (
+        '<html><body><a href="./index.php">Board index</a>'
+        '<a href="./viewforum.php?f=1">Section 1</a></body></html>'
+    ),
+}
+
+
+class SubdirectoryBoardTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.output_dir = directory.name
+        storage = DirectoryStorage(self.output_dir)
+        for url, text in PAGES.items():
+            storage.write(page_path(url), url, text.encode('utf-8'))
+
+    def read(self, url):
+        with open(os.path.join(self.output_dir, page_path(url)), 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def test_board_index_links_are_rewritten(self):
+        self.assertEqual(page_path(BASE_URL), 'forum/index.html')
+        visited, rewritten, missing = rewrite_mirror_links(self.output_dir, BASE_URL, workers=1)
+        self.assertEqual((visited, rewritten, missing), (3, 3, 0))
+        self.assertIn('href="../forum/section_1/index.html"', self.read(BASE_URL))
+        self.assertIn('href="../../forum/index.html"', self.read(f'{BASE_URL}viewforum.php?f=1'))
+        self.assertIn('href="../../../forum/index.html"', self.read(f'{BASE_URL}viewtopic.php?f=1&t=2'))
+
+    def test_second_pass_visits_nothing(self):
+        rewrite_mirror_links(self.output_dir, BASE_URL, workers=1)
+        self.assertEqual(rewrite_mirror_links(self.output_dir, BASE_URL, workers=1), (0, 0, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
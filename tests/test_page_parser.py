@@ -0,0 +1,29 @@
+import unittest
+
+from fixture_server import FixtureBoard
+from page_parser import pagination_starts, parse_page
+
+BASE_URL = 'http://127.0.0.1:8000/'
+
+
+def first_topic_page(board):
+    return parse_page(board.render_topic(1, 1, 0), f'{BASE_URL}viewtopic.php?f=1&t=1')
+
+
+class PaginationStartsTest(unittest.TestCase):
+    def test_single_page_topic_has_no_other_pages(self):
+        # 13 posts on a board showing 15 per page: no page links, only "13 posts • Page 1 of 1"
+        page = first_topic_page(FixtureBoard(posts_per_topic=13, posts_per_page=15))
+        self.assertEqual(pagination_starts(page), [])
+
+    def test_pages_beyond_the_link_window(self):
+        page = first_topic_page(FixtureBoard(posts_per_topic=95, posts_per_page=10))
+        self.assertEqual(pagination_starts(page), list(range(10, 100, 10)))
+
+    def test_page_size_from_the_links(self):
+        page = first_topic_page(FixtureBoard(posts_per_topic=31, posts_per_page=15))
+        self.assertEqual(pagination_starts(page), [15, 30])
+
+
+if __name__ == '__main__':
+    unittest.main()
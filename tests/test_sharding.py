@@ -0,0 +1,91 @@
+import glob
+import gzip
+import os
+import tempfile
+import unittest
+
+from sharding import SharedFrontier, merge_shards, shard_dir, shard_status
+from storage import STORAGE_BACKENDS, PageArchive, open_storage
+
+
+class MergeShardsTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.output_dir = directory.name
+        for shard in range(2):
+            source_dir = shard_dir(self.output_dir, shard)
+            os.makedirs(source_dir)
+            storage = open_storage('directory', source_dir)
+            storage.write(f'forum/section_{shard}/index.html', None, f'<html>section {shard}</html>'.encode('utf-8'))
+            with open(os.path.join(source_dir, 'posts.jsonl'), 'w', encoding='utf-8') as f:
+                f.write(f'{{"post_id": "p{shard}"}}\n')
+            with open(os.path.join(source_dir, 'visited_urls.txt'), 'w', encoding='utf-8') as f:
+                f.write(f'https://example.com/viewforum.php?f={shard}\n')
+
+    def merged_files(self, storage):
+        files = {}
+        for name in ('posts.jsonl', 'visited_urls.txt'):
+            with open(os.path.join(self.output_dir, name), 'r', encoding='utf-8') as f:
+                files[name] = f.read()
+        target = open_storage(storage, self.output_dir)
+        try:
+            files['pages'] = [(path, size) for path, size, _, _ in target.entries('forum/')]
+        finally:
+            target.close()
+        return files
+
+    def test_merging_twice_gives_the_same_files(self):
+        for storage in STORAGE_BACKENDS:
+            with self.subTest(storage=storage):
+                self.assertEqual(merge_shards(self.output_dir, storage), 2)
+                first = self.merged_files(storage)
+                self.assertEqual(first['posts.jsonl'], '{"post_id": "p0"}\n{"post_id": "p1"}\n')
+                merge_shards(self.output_dir, storage)
+                self.assertEqual(self.merged_files(storage), first)
+
+    def test_merging_again_appends_nothing_to_an_archive(self):
+        merge_shards(self.output_dir, 'warc')
+        archive_dir = os.path.join(self.output_dir, 'archive')
+        sizes = {name: os.path.getsize(os.path.join(archive_dir, name)) for name in os.listdir(archive_dir)
+                 if name.endswith('.warc.gz')}
+        merge_shards(self.output_dir, 'warc')
+        self.assertEqual({name: os.path.getsize(os.path.join(archive_dir, name)) for name in sizes}, sizes)
+
+    def test_archive_urls_come_from_the_frontier(self):
+        # Only the page of shard 0 is known to the frontier
+        shared = SharedFrontier(os.path.join(self.output_dir, 'frontier.db'))
+        shared.add([('f0', 'https://example.com/viewforum.php?f=0', 0, 0)])
+        shared.complete('f0')
+        shared.close()
+        merge_shards(self.output_dir, 'warc')
+        archive = PageArchive(os.path.join(self.output_dir, 'archive'))
+        try:
+            self.assertEqual(archive.url('forum/section_0/index.html'), 'https://example.com/viewforum.php?f=0')
+            self.assertIsNone(archive.url('forum/section_1/index.html'))
+        finally:
+            archive.close()
+        records = b''.join(gzip.open(name).read()
+                           for name in glob.glob(os.path.join(self.output_dir, 'archive', '*.warc.gz')))
+        self.assertIn(b'WARC-Target-URI: https://example.com/viewforum.php?f=0\r\n', records)
+        self.assertNotIn(b'WARC-Target-URI: None', records)
+
+
+class ShardStatusTest(unittest.TestCase):
+    def test_counts_per_shard_and_state(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        shared = SharedFrontier(os.path.join(directory.name, 'frontier.db'))
+        self.addCleanup(shared.close)
+        shared.add([(f'key{n}', f'https://example.com/viewtopic.php?t={n}', 0, n % 2) for n in range(5)])
+        claimed = shared.claim(0, 2)
+        shared.complete(claimed[0][0])
+        shared.fail(claimed[1][0])
+        self.assertEqual(shard_status(shared), {
+            0: {'pending': 1, 'claimed': 0, 'done': 1, 'failed': 1},
+            1: {'pending': 2, 'claimed': 0, 'done': 0, 'failed': 0},
+        })
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import gzip
+import os
+import tempfile
+import unittest
+
+from storage import PageArchive
+
+
+class CompactTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.archive_dir = os.path.join(directory.name, 'archive')
+        # Small segments, so the pages are spread over several of them
+        self.archive = PageArchive(self.archive_dir, segment_size=2000)
+        self.addCleanup(self.archive.close)
+        self.pages = {}
+        for rewrite in range(3):
+            for n in range(10):
+                path = f'forum/section_1/topic_{n}/page_0.html'
+                self.pages[path] = f'<html>topic {n}, pass {rewrite} {"x" * 200}</html>'.encode('utf-8')
+                self.archive.write(path, f'https://example.com/viewtopic.php?f=1&t={n}', self.pages[path])
+
+    def segment_sizes(self):
+        return {name: os.path.getsize(os.path.join(self.archive_dir, name)) for name in self.archive.segment_names()}
+
+    def test_compaction_keeps_the_newest_copies(self):
+        before, after = self.archive.compact()
+        # Two of the three copies of every page are dropped
+        self.assertLess(after, before * 0.4)
+        self.assertEqual(sum(self.segment_sizes().values()), after)
+        for path, data in self.pages.items():
+            self.assertEqual(self.archive.read(path), data)
+        records = b''.join(gzip.open(os.path.join(self.archive_dir, name)).read()
+                           for name in self.archive.segment_names())
+        self.assertEqual(records.count(b'WARC/1.1\r\n'), len(self.pages))
+
+    def test_writes_after_compaction(self):
+        self.archive.compact()
+        self.archive.write('forum/index.html', 'https://example.com/index.php', b'<html>index</html>')
+        self.assertEqual(self.archive.read('forum/index.html'), b'<html>index</html>')
+        sizes = self.segment_sizes()
+        self.assertEqual(self.archive.compact()[1], sum(sizes.values()))
+        self.assertEqual(self.archive.read('forum/section_1/topic_0/page_0.html'),
+                         self.pages['forum/section_1/topic_0/page_0.html'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,315 @@
+from collections import deque
+from urllib.parse import urlparse
+from array import array
+
+import math
+import sqlite3
+import threading
+
+URL_INDEXES = ('compact', 'disk', 'python')
+
+MASK64 = (1 << 64) - 1
+GOLDEN = 0x9E3779B97F4A7C15  # 2**64 / golden ratio, for Fibonacci hashing
+
+# Packed URL key: page type (2 bits) | section + 1 (17) | topic + 1 (27) | start + 1 (18), 0 marking an absent parameter
+PAGE_KINDS = {'viewforum.php': 1, 'viewtopic.php': 2}
+SCRIPTS = {kind: script for script, kind in PAGE_KINDS.items()}
+SECTION_BITS, TOPIC_BITS, START_BITS = 17, 27, 18
+
+
+def board_prefix(base_url):
+    """The board's URL up to its scripts, e.g. 'https://example.com/forum/'"""
+    parsed = urlparse(base_url)
+    directory = parsed.path
+    if '.' in directory.rsplit('/', 1)[-1]:
+        directory = directory.rsplit('/', 1)[0]
+    return f"{parsed.scheme}://{parsed.netloc.lower()}{directory.rstrip('/')}/"
+
+
+class URLInterner:
+    """
+    Maps normalized forum URLs to 64-bit integer keys and back. Section and topic
+    pages of the board pack into (page type, section, topic, start); any other
+    URL (the index, a few static pages) is numbered in a side table.
+    """
+
+    def __init__(self, base_url):
+        self.prefix = board_prefix(base_url)
+        self.lock = threading.Lock()
+        self.strings = [None]  # Key 0 is reserved as the empty slot of IntSet
+        self.string_keys = {}
+
+    def pack(self, key):
+        """Integer key of a normalized section or topic URL, or None if it does not fit the layout"""
+        if not key.startswith(self.prefix):
+            return None
+        script, _, query = key[len(self.prefix):].partition('?')
+        kind = PAGE_KINDS.get(script)
+        if kind is None:
+            return None
+        fields = {'f': 0, 't': 0, 'start': 0}
+        for param in query.split('&') if query else ():
+            name, _, value = param.partition('=')
+            # Only canonical numbers, so that url() gives back exactly the normalized URL
+            if name not in fields or not value.isdigit() or str(int(value)) != value:
+                return None
+            fields[name] = int(value) + 1
+        section, topic, start = fields['f'], fields['t'], fields['start']
+        if section >> SECTION_BITS or topic >> TOPIC_BITS or start >> START_BITS:
+            return None
+        return ((kind << SECTION_BITS | section) << TOPIC_BITS | topic) << START_BITS | start
+
+    def intern(self, key, url=None):
+        """
+        Integer key of a normalized URL.
+        :param url: URL to give back for key when it does not pack (by default the normalized URL itself)
+        """
+        packed = self.pack(key)
+        if packed is not None:
+            return packed
+        with self.lock:
+            number = self.string_keys.get(key)
+            if number is None:
+                number = self.string_keys[key] = len(self.strings)
+                self.strings.append(url or key)
+        return number
+
+    def lookup(self, key):
+        """Integer key of a normalized URL, or None if it does not pack and was never interned"""
+        packed = self.pack(key)
+        if packed is not None:
+            return packed
+        return self.string_keys.get(key)
+
+    def url(self, key):
+        """The normalized URL of an integer key"""
+        kind = key >> (SECTION_BITS + TOPIC_BITS + START_BITS)
+        if not kind:
+            return self.strings[key]
+        start = key & ((1 << START_BITS) - 1)
+        topic = (key >> START_BITS) & ((1 << TOPIC_BITS) - 1)
+        section = (key >> (START_BITS + TOPIC_BITS)) & ((1 << SECTION_BITS) - 1)
+        params = []
+        if section:
+            params.append(f"f={section - 1}")
+        if start:
+            params.append(f"start={start - 1}")
+        if topic:
+            params.append(f"t={topic - 1}")
+        query = f"?{'&'.join(params)}" if params else ''
+        return f"{self.prefix}{SCRIPTS[kind]}{query}"
+
+
+def number_key(value):
+    """Integer key of a section or topic number, or None if it is not a plain number"""
+    if value.isdigit() and str(int(value)) == value and int(value) < MASK64:
+        return int(value) + 1
+    return None
+
+
+class IntSet:
+    """
+    Set of non-zero 64-bit integers in one flat array (open addressing, linear
+    probing), about 12-24 bytes per key instead of ~100 for a set of ints.
+    """
+
+    def __init__(self, capacity=1024):
+        bits = max(4, (capacity * 3 // 2).bit_length())
+        self.table = array('Q', bytes(8 << bits))
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def slot(self, table, key):
+        # The table is read once, so a lookup racing a resize sees one consistent table
+        bits = len(table).bit_length() - 1
+        mask = len(table) - 1
+        index = ((key * GOLDEN) & MASK64) >> (64 - bits)
+        while True:
+            value = table[index]
+            if value == key or not value:
+                return index
+            index = (index + 1) & mask
+
+    def __contains__(self, key):
+        table = self.table
+        return table[self.slot(table, key)] == key
+
+    def add(self, key):
+        """Add a key, returning False if it was already there"""
+        table = self.table
+        index = self.slot(table, key)
+        if table[index] == key:
+            return False
+        table[index] = key
+        self.size += 1
+        if self.size * 3 > len(table) * 2:
+            self.grow()
+        return True
+
+    def grow(self):
+        table = array('Q', bytes(16 * len(self.table)))
+        for key in self.table:
+            if key:
+                table[self.slot(table, key)] = key
+        self.table = table
+
+    def nbytes(self):
+        return len(self.table) * self.table.itemsize
+
+
+class IntQueue:
+    """FIFO of 64-bit integers in fixed-size array chunks (8 bytes per entry)"""
+
+    def __init__(self, chunk_size=4096):
+        self.chunk_size = chunk_size
+        self.chunks = deque()
+        self.head = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def append(self, key):
+        if not self.chunks or len(self.chunks[-1]) >= self.chunk_size:
+            self.chunks.append(array('Q'))
+        self.chunks[-1].append(key)
+        self.size += 1
+
+    def popleft(self):
+        if not self.size:
+            raise IndexError('pop from an empty IntQueue')
+        chunk = self.chunks[0]
+        key = chunk[self.head]
+        self.head += 1
+        self.size -= 1
+        if self.head == len(chunk):
+            self.chunks.popleft()
+            self.head = 0
+        return key
+
+
+class BloomFilter:
+    """Bloom filter over 64-bit integer keys"""
+
+    def __init__(self, capacity, error_rate=0.01):
+        self.size = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def positions(self, key):
+        # Double hashing: two independent 64-bit hashes give all k positions
+        first = (key * GOLDEN) & MASK64
+        second = (((key ^ (key >> 31)) * 0xBF58476D1CE4E5B9) & MASK64) | 1
+        return [((first + i * second) & MASK64) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        for position in self.positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self.positions(key))
+
+
+class DiskIntSet:
+    """
+    Set of 64-bit integers in an SQLite table, for boards whose URL index does not
+    fit in memory. A Bloom filter in front answers most lookups of new keys
+    without touching the disk; additions are written in batches. The table is a
+    scratch index and is emptied when opened.
+    """
+
+    def __init__(self, path, name='keys', capacity=1000000, error_rate=0.01, batch_size=10000):
+        """
+        :param capacity: Expected number of keys; beyond it the Bloom filter lets more lookups through to disk
+        """
+        self.name = name
+        self.batch_size = batch_size
+        self.bloom = BloomFilter(capacity, error_rate)
+        self.lock = threading.Lock()
+        self.buffer = set()
+        self.size = 0
+        self.disk_lookups = 0
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=OFF')
+        with self.connection:
+            self.connection.execute(f'DROP TABLE IF EXISTS {name}')
+            self.connection.execute(f'CREATE TABLE {name} (key INTEGER PRIMARY KEY)')
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, key):
+        if key not in self.bloom:
+            return False
+        with self.lock:
+            if key in self.buffer:
+                return True
+            self.disk_lookups += 1
+            # SQLite integers are signed
+            return self.connection.execute(
+                f'SELECT 1 FROM {self.name} WHERE key = ?', (key - (1 << 63),)).fetchone() is not None
+
+    def add(self, key):
+        """Add a key, returning False if it was already there"""
+        if key in self:
+            return False
+        self.bloom.add(key)
+        with self.lock:
+            self.buffer.add(key)
+            self.size += 1
+            if len(self.buffer) >= self.batch_size:
+                self.flush()
+        return True
+
+    def flush(self):
+        with self.connection:
+            self.connection.executemany(f'INSERT OR IGNORE INTO {self.name} (key) VALUES (?)',
+                                        [(key - (1 << 63),) for key in self.buffer])
+        self.buffer = set()
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+class CompactSet:
+    """
+    Set-like container that stores its items as integer keys in an IntSet or
+    DiskIntSet. Items the key function maps to None are kept as they are.
+    """
+
+    def __init__(self, key, keys=None, lookup=None):
+        """
+        :param lookup: Callable giving the key of an item for membership tests, or None if it has
+            none yet; by default the key function, for key functions that record nothing
+        """
+        self.key = key
+        self.lookup = lookup or key
+        self.keys = keys if keys is not None else IntSet()
+        self.other = set()
+
+    def __len__(self):
+        return len(self.keys) + len(self.other)
+
+    def __contains__(self, item):
+        key = self.lookup(item)
+        return item in self.other if key is None else key in self.keys
+
+    def add(self, item):
+        key = self.key(item)
+        if key is None:
+            self.other.add(item)
+        else:
+            self.keys.add(key)
+
+    def update(self, items):
+        for item in items:
+            self.add(item)
+
+    def __ior__(self, items):
+        self.update(items)
+        return self